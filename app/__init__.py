@@ -41,6 +41,8 @@ def app_init():
     from .routes import bp_notifications
     from .routes import bp_chat
     from .routes import bp_settings
+    from .routes import bp_media
+    from .routes import bp_uploads
 
     app.register_blueprint(bp_index)
     app.register_blueprint(bp_auth)
@@ -48,6 +50,8 @@ def app_init():
     app.register_blueprint(bp_notifications)
     app.register_blueprint(bp_chat)
     app.register_blueprint(bp_settings)
+    app.register_blueprint(bp_media)
+    app.register_blueprint(bp_uploads)
 
     # Register error handlers and logging
     from .error_handlers import register_error_handlers, setup_logging
@@ -56,6 +60,17 @@ def app_init():
 
     from . import sockets
 
+    from .services import image_service
+    image_service.start(app)
+
+    if app.config.get('LIKE_BUFFER_ENABLED'):
+        from .services import like_buffer
+        like_buffer.start(app)
+
+    if app.config.get('UPLOAD_GC_ENABLED'):
+        from .services import upload_sweeper
+        upload_sweeper.start(app)
+
     return app
     
 
@@ -21,6 +21,61 @@ class Config:
     # Upload configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'app/static/uploads')
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 10485760))  # 10MB default
+    # Worker processes that render resized image variants
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+    # Media endpoint (/media/<path>): uploads never change, so they are cached
+    # for MEDIA_MAX_AGE seconds as immutable. MEDIA_SENDFILE hands the file
+    # to a front proxy: 'x-accel' (nginx, internal location MEDIA_ACCEL_PREFIX
+    # aliased to app/static) or 'x-sendfile' (Apache/lighttpd); empty serves
+    # it from Flask
+    MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 31536000))
+    MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '').lower()
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+    # Feed pagination
+    POSTS_PAGE_SIZE = int(os.environ.get('POSTS_PAGE_SIZE', 50))
+    POSTS_MAX_PAGE_SIZE = int(os.environ.get('POSTS_MAX_PAGE_SIZE', 100))
+
+    # How many recent likers are embedded in each post payload
+    LIKE_SAMPLE_SIZE = int(os.environ.get('LIKE_SAMPLE_SIZE', 3))
+
+    # Comment pagination and how many replies are previewed per comment
+    COMMENTS_PAGE_SIZE = int(os.environ.get('COMMENTS_PAGE_SIZE', 20))
+    COMMENTS_MAX_PAGE_SIZE = int(os.environ.get('COMMENTS_MAX_PAGE_SIZE', 100))
+    COMMENT_REPLY_PREVIEW = int(os.environ.get('COMMENT_REPLY_PREVIEW', 3))
+
+    # Chat history pagination
+    MESSAGES_PAGE_SIZE = int(os.environ.get('MESSAGES_PAGE_SIZE', 50))
+    MESSAGES_MAX_PAGE_SIZE = int(os.environ.get('MESSAGES_MAX_PAGE_SIZE', 100))
+
+    # Home timelines: how many of a new friend's posts to copy into a timeline,
+    # and the friend count above which an author's posts are pulled at read
+    # time instead of being fanned out on write
+    TIMELINE_BACKFILL_SIZE = int(os.environ.get('TIMELINE_BACKFILL_SIZE', 50))
+    TIMELINE_FANOUT_FRIEND_LIMIT = int(os.environ.get('TIMELINE_FANOUT_FRIEND_LIMIT', 5000))
+
+    # Like write coalescing: batch like/unlike toggles per post and flush them
+    # (one commit, one count broadcast per post) every LIKE_BUFFER_WINDOW_MS
+    LIKE_BUFFER_ENABLED = os.environ.get('LIKE_BUFFER_ENABLED', 'False').lower() in ('true', '1')
+    LIKE_BUFFER_WINDOW_MS = int(os.environ.get('LIKE_BUFFER_WINDOW_MS', 300))
+
+    # Upload sweeper: deleting posts, avatars and accounts only drops
+    # references; every UPLOAD_GC_INTERVAL_SECONDS unreferenced files older
+    # than UPLOAD_GC_GRACE_SECONDS are removed, UPLOAD_GC_BATCH_SIZE paths
+    # per query. UPLOAD_GC_DRY_RUN only logs what would be deleted. Off by
+    # default: enable it once migrate_upload_layout.py has given every
+    # existing upload its blob row.
+    UPLOAD_GC_ENABLED = os.environ.get('UPLOAD_GC_ENABLED', 'False').lower() in ('true', '1')
+    UPLOAD_GC_INTERVAL_SECONDS = int(os.environ.get('UPLOAD_GC_INTERVAL_SECONDS', 3600))
+    UPLOAD_GC_GRACE_SECONDS = int(os.environ.get('UPLOAD_GC_GRACE_SECONDS', 86400))
+    UPLOAD_GC_BATCH_SIZE = int(os.environ.get('UPLOAD_GC_BATCH_SIZE', 500))
+    UPLOAD_GC_DRY_RUN = os.environ.get('UPLOAD_GC_DRY_RUN', 'False').lower() in ('true', '1')
+
+    # Resumable chunked uploads are assembled here (outside app/static) and
+    # abandoned ones are removed by the upload sweeper after the TTL
+    UPLOAD_SESSION_FOLDER = os.environ.get('UPLOAD_SESSION_FOLDER', 'instance/upload_sessions')
+    UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', 86400))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -45,6 +100,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    UPLOAD_GC_ENABLED = False
 
 # Configuration mapping
 config = {
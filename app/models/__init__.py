@@ -1,16 +1,27 @@
 from datetime import datetime, timezone
-from flask import json
+from flask import json, current_app
 from .. import db
 
+def user_pair(user1_id, user2_id):
+    """The canonical (low_user_id, high_user_id) order of two users"""
+    return min(user1_id, user2_id), max(user1_id, user2_id)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     display_name = db.Column(db.String(100), nullable=True)
     bio = db.Column(db.Text, nullable=True)
-    avatar_path = db.Column(db.String(255), nullable=True)
+    # Indexed, like post.image_path and message.image_url, for image workers
+    # and the upload sweeper looking up rows by upload
+    avatar_path = db.Column(db.String(255), nullable=True, index=True)
+    # JSON {variant name: path} of resized avatars, filled in by ImageService
+    avatar_variants = db.Column(db.Text, nullable=True)
     is_online = db.Column(db.Boolean, default=False)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set while the user has too many friends to fan posts out on write;
+    # re-checked whenever one of their friendships changes
+    timeline_pull = db.Column(db.Boolean, default=False, nullable=False, index=True)
     
     sent_requests = db.relationship('Friendship', 
                                   foreign_keys='Friendship.requester_id',
@@ -21,7 +32,7 @@ class User(db.Model):
                                       backref='requested', 
                                       lazy='dynamic')
     notifications = db.relationship('Notification', backref='user', lazy='dynamic')
-    post_likes = db.relationship('PostLike', backref = db.backref('user', lazy=True))
+    post_likes = db.relationship('PostLike', backref = db.backref('user', lazy=True), cascade='all, delete-orphan')
 
 
     def to_public_data(self):
@@ -31,60 +42,143 @@ class User(db.Model):
             'display_name': self.display_name,
             'bio': self.bio,
             'avatar_path': self.avatar_path,
+            'avatar_variants': json.loads(self.avatar_variants) if self.avatar_variants else None,
             'is_online': self.is_online,
             'last_seen': self.last_seen.isoformat()
         }
 
 
 class Friendship(db.Model):
+    __table_args__ = (
+        # One friendship per pair of users, looked up in canonical order
+        db.UniqueConstraint('low_user_id', 'high_user_id', name='uq_friendship_user_pair'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     requester_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     requested_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    low_user_id = db.Column(db.Integer, nullable=False)
+    high_user_id = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.low_user_id, self.high_user_id = user_pair(self.requester_id, self.requested_id)
     
     def __repr__(self):
         return f'<Friendship {self.requester_id} -> {self.requested_id} ({self.status})>'
 
 class Messenger(db.Model):
+    __table_args__ = (
+        # One conversation per pair of users, looked up in canonical order
+        db.UniqueConstraint('low_user_id', 'high_user_id', name='uq_messenger_user_pair'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     first_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     second_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    low_user_id = db.Column(db.Integer, nullable=False)
+    high_user_id = db.Column(db.Integer, nullable=False)
+    # Conversation summary for the inbox, maintained by ChatService
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_preview = db.Column(db.String(255), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True, index=True)
+    first_user_unread = db.Column(db.Integer, default=0, nullable=False)
+    second_user_unread = db.Column(db.Integer, default=0, nullable=False)
+    # Read cursors: each participant has read every message up to this id
+    first_user_last_read_message_id = db.Column(db.Integer, nullable=True)
+    second_user_last_read_message_id = db.Column(db.Integer, nullable=True)
     messages = db.relationship("Message", backref='messenger', cascade='all, delete-orphan')
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.low_user_id, self.high_user_id = user_pair(self.first_user_id, self.second_user_id)
+
 class Message(db.Model):
+    __table_args__ = (
+        # Keyset pagination of a conversation, newest page first
+        db.Index('ix_message_messenger_created_at_id', 'messenger_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     messenger_id = db.Column(db.Integer, db.ForeignKey('messenger.id', ondelete='CASCADE'))
     content = db.Column(db.Text, nullable=True)
-    image_url = db.Column(db.String(255), nullable=True)
-    is_read = db.Column(db.Boolean, default=False)
+    image_url = db.Column(db.String(255), nullable=True, index=True)
+    image_variants = db.Column(db.Text, nullable=True)
+    image_width = db.Column(db.Integer, nullable=True)
+    image_height = db.Column(db.Integer, nullable=True)
+    image_placeholder = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class PostLike(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'user_id', name='uq_post_like_post_user'),
+        # Newest likes of a post first: liker samples and the likers list
+        db.Index('ix_post_like_post_id_id', 'post_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
 
 class PostComment(db.Model):
+    __table_args__ = (
+        # Keyset pagination of top-level comments and of a comment's replies
+        db.Index('ix_post_comment_post_parent_id', 'post_id', 'parent_id', 'id'),
+        db.Index('ix_post_comment_parent_id_id', 'parent_id', 'id'),
+        # Subtree fetch/count/delete as one range scan over the path
+        db.Index('ix_post_comment_post_path', 'post_id', 'path'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('post_comment.id', ondelete='CASCADE'), nullable=True)
     content = db.Column(db.Text, nullable=False)
+    # Materialized path: zero-padded ids from the top-level comment down to
+    # this one, each followed by '/', e.g. "0000000012/0000000040/"
+    PATH_LENGTH = 1024
+    SEGMENT_LENGTH = 11
+    # Deepest a reply can nest before its path no longer fits
+    MAX_DEPTH = PATH_LENGTH // SEGMENT_LENGTH
+    path = db.Column(db.String(PATH_LENGTH), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     user = db.relationship('User', backref=db.backref('comments', lazy=True, cascade='all, delete-orphan'))
     parent_comment = db.relationship("PostComment", backref=db.backref('replies', cascade='all, delete-orphan'), remote_side=[id])
 
+    @staticmethod
+    def path_segment(comment_id):
+        """Path component for one comment id"""
+        return f"{comment_id:010d}/"
+
+    def subtree_filter(self):
+        """Filter matching this comment and all of its nested replies.
+
+        Paths only contain digits and '/', and '0' sorts right after '/', so
+        the subtree is the half-open range [path, path with its trailing '/'
+        replaced by '0').
+        """
+        return db.and_(
+            PostComment.post_id == self.post_id,
+            PostComment.path >= self.path,
+            PostComment.path < self.path[:-1] + '0'
+        )
+
     @property
     def reply_count(self):
         """Get count of direct replies to this comment"""
         return len(self.replies) if self.replies else 0
 
-    def to_dict(self):
-        """Convert comment to dictionary for JSON serialization"""
+    def to_dict(self, replies=None):
+        """Convert comment to dictionary for JSON serialization.
+        Pass already serialized replies to avoid lazy loading the subtree."""
+        if replies is None:
+            replies = [reply.to_dict() for reply in self.replies] if self.replies else []
+
         # Ensure timestamp is treated as UTC by adding timezone info
         created_at_utc = self.created_at.replace(tzinfo=timezone.utc) if self.created_at.tzinfo is None else self.created_at
 
@@ -98,40 +192,58 @@ class PostComment(db.Model):
             'parent_id': self.parent_id,
             'content': self.content,
             'created_at': created_at_utc.isoformat(),
-            'reply_count': self.reply_count,
-            'replies': [reply.to_dict() for reply in self.replies] if self.replies else []
+            'reply_count': len(replies),
+            'replies': replies
         }
 
 class Post(db.Model):
+    __table_args__ = (
+        # Keyset pagination indexes for the global feed and profile pages
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+        db.Index('ix_post_owner_created_at_id', 'owner', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     owner = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
-    image_path = db.Column(db.String(100), nullable=True)
+    image_path = db.Column(db.String(100), nullable=True, index=True)
+    # JSON {variant name: path} of resized images, filled in by ImageService
+    image_variants = db.Column(db.Text, nullable=True)
+    # Display size and a tiny data URI preview, copied from the upload so
+    # clients can reserve space and show something before the image loads
+    image_width = db.Column(db.Integer, nullable=True)
+    image_height = db.Column(db.Integer, nullable=True)
+    image_placeholder = db.Column(db.Text, nullable=True)
     description = db.Column(db.Text, nullable=True)
+    # Denormalized counters, kept in step by PostService in the same
+    # transaction as the like/comment rows they count
+    like_count = db.Column(db.Integer, default=0, nullable=False)
+    comment_count = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     owner_user = db.relationship('User', backref=db.backref('posts', lazy=True, cascade='all, delete-orphan'))
     likes = db.relationship("PostLike", backref='post', cascade='all, delete-orphan')
     comments = db.relationship("PostComment", backref='post', cascade='all, delete-orphan')
 
-    def to_dict(self):
-        likes = [
-            {
-                "user_id": like.user_id,
-                "username": like.user.username
-            }
-            for like in self.likes
-        ]
-
-        # Count all comments including nested replies
-        def count_all_comments(comments):
-            total = 0
-            for comment in comments:
-                total += 1
-                if comment.replies:
-                    total += count_all_comments(comment.replies)
-            return total
-
-        comment_count = count_all_comments([c for c in self.comments if c.parent_id is None])
+    def to_dict(self, recent_likers=None, liked_by_me=False):
+        """Serialize the post with its like count and a few recent likers.
+
+        Feed code passes preloaded recent_likers and liked_by_me so that
+        nothing is queried per post; the full list is served by
+        /api/posts/<id>/likes.
+        """
+        if recent_likers is None:
+            recent_likers = [
+                {
+                    "user_id": user_id,
+                    "username": username
+                }
+                for user_id, username in db.session.query(PostLike.user_id, User.username)
+                                                   .join(User, PostLike.user_id == User.id)
+                                                   .filter(PostLike.post_id == self.id)
+                                                   .order_by(PostLike.id.desc())
+                                                   .limit(current_app.config['LIKE_SAMPLE_SIZE'])
+                                                   .all()
+            ]
 
         # Ensure timestamps are treated as UTC by adding timezone info
         created_at_utc = self.created_at.replace(tzinfo=timezone.utc) if self.created_at.tzinfo is None else self.created_at
@@ -144,13 +256,63 @@ class Post(db.Model):
             'owner_display_name': self.owner_user.display_name,
             'owner_avatar': self.owner_user.avatar_path,
             'image_path': self.image_path,
+            'image_variants': json.loads(self.image_variants) if self.image_variants else None,
+            'image_width': self.image_width,
+            'image_height': self.image_height,
+            'image_placeholder': self.image_placeholder,
             'description': self.description,
             'created_at': created_at_utc.isoformat(),
             'updated_at': updated_at_utc.isoformat(),
-            "likes": likes,
-            "comment_count": comment_count
+            "like_count": self.like_count or 0,
+            "liked_by_me": liked_by_me,
+            "recent_likers": recent_likers,
+            "comment_count": self.comment_count or 0
         }
 
+class TimelineEntry(db.Model):
+    """A post fanned out into one user's home timeline.
+
+    created_at is copied from the post so a timeline page is a single range
+    scan over (user_id, created_at, post_id).
+    """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='uq_timeline_entry_user_post'),
+        db.Index('ix_timeline_entry_user_created_at_post', 'user_id', 'created_at', 'post_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+class UploadBlob(db.Model):
+    """One stored upload file, keyed by the SHA-256 of its bytes.
+
+    Posts, chat messages and avatars that upload identical bytes share the
+    blob; ref_count is the number of rows pointing at path.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    # Display size and inline preview, computed once when the blob is stored
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    placeholder = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """A resumable chunked upload in progress.
+
+    Chunks are appended to a file in UPLOAD_SESSION_FOLDER named after the
+    session id; its size on disk is the offset the next chunk must start at.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
@@ -0,0 +1,28 @@
+import base64
+from datetime import datetime
+
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe cursor"""
+    raw = f"{created_at.replace(tzinfo=None).isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def clamp_page_size(value, default, maximum):
+    """Parse a requested page size, falling back to default and capping at maximum"""
+    try:
+        size = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
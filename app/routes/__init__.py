@@ -3,4 +3,6 @@ from .index import bp_index
 from .friends import bp_friends
 from .notifications import bp_notifications
 from .chat import bp_chat
-from .settings import bp_settings
\ No newline at end of file
+from .settings import bp_settings
+from .media import bp_media
+from .uploads import bp_uploads
\ No newline at end of file
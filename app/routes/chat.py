@@ -1,130 +1,66 @@
-from flask import Blueprint, session, request, jsonify
-from ..models import Messenger, Message, User
+from flask import Blueprint, session, request, jsonify, current_app
+from ..models import Message, User
 from ..decorators import login_required
 from .. import db, socketio
-from ..services import user_service, post_service
-import os
-import uuid
+from ..pagination import clamp_page_size
+from ..services.chat_service import ChatServiceError
+from ..services.upload_service import UploadServiceError
+from ..services import post_service, image_service, upload_service, chat_service
+from flask import json
 
 bp_chat = Blueprint("bp_chat", __name__)
 
+# Chat images uploaded but not sent yet, kept in the session so a message can
+# only carry an image_url this user got from upload_chat_image
+PENDING_IMAGES_KEY = 'chat_images'
+MAX_PENDING_IMAGES = 10
+
 @bp_chat.route("/api/friend_list")
 @login_required
 def get_friend_list():
     """Get friends list with last message info for messenger"""
-    current_user_id = session["user_id"]
-    friends = user_service.get_user_friends(current_user_id)
-
-    # Enhance friends data with last message information
-    friends_with_messages = []
-    for friend in friends:
-        friend_id = friend['id']
-
-        # Find the messenger between current user and friend
-        messenger = db.session.query(Messenger).filter(
-            ((Messenger.first_user_id == current_user_id) & (Messenger.second_user_id == friend_id)) |
-            ((Messenger.first_user_id == friend_id) & (Messenger.second_user_id == current_user_id))
-        ).first()
-
-        last_message = None
-        last_message_time = None
-        unread_count = 0
-
-        if messenger:
-            # Get the last message in this conversation
-            latest_msg = db.session.query(Message).filter(
-                Message.messenger_id == messenger.id
-            ).order_by(Message.created_at.desc()).first()
-
-            if latest_msg:
-                if latest_msg.image_url and not latest_msg.content:
-                    last_message = "📷 Image"
-                elif latest_msg.image_url and latest_msg.content:
-                    last_message = f"📷 {latest_msg.content}"
-                else:
-                    last_message = latest_msg.content
-                last_message_time = latest_msg.created_at.strftime("%H:%M")
-
-            # Count unread messages from this friend
-            unread_count = db.session.query(Message).filter(
-                Message.messenger_id == messenger.id,
-                Message.receiver_id == current_user_id,
-                Message.is_read == False
-            ).count()
-
-        friends_with_messages.append({
-            'id': friend['id'],
-            'username': friend['username'],
-            'avatar_path': friend.get('avatar_path'),
-            'display_name': friend.get('display_name'),
-            'is_online': friend['is_online'],
-            'last_message': last_message or 'No messages yet',
-            'timestamp': last_message_time or '',
-            'messenger_id': messenger.id if messenger else None,
-            'unread_count': unread_count
-        })
-
-    return jsonify(friends_with_messages)
+    return jsonify(chat_service.get_inbox(session["user_id"]))
 
 @bp_chat.route("/api/messages/<int:friend_id>")
 @login_required
 def get_messages(friend_id):
-    """Get all messages between current user and a friend"""
+    """Get one page of messages between current user and a friend, newest
+    page first; pass next_cursor as ?before= to scroll back"""
     current_user_id = session["user_id"]
 
-    # Find the messenger between current user and friend
-    messenger = db.session.query(Messenger).filter(
-        ((Messenger.first_user_id == current_user_id) & (Messenger.second_user_id == friend_id)) |
-        ((Messenger.first_user_id == friend_id) & (Messenger.second_user_id == current_user_id))
-    ).first()
-
-    if not messenger:
-        # Create a new messenger if one doesn't exist
-        messenger = Messenger(
-            first_user_id=current_user_id,
-            second_user_id=friend_id
-        )
-        db.session.add(messenger)
-        db.session.commit()
+    # Find the messenger between current user and friend, or create it
+    messenger = chat_service.get_or_create_messenger(current_user_id, friend_id)
+    db.session.commit()
 
-    # Get all messages in this conversation
-    messages_with_users = db.session.query(Message, User.username, User.avatar_path, User.display_name)\
-                                   .join(User, Message.sender_id == User.id)\
-                                   .filter(Message.messenger_id == messenger.id)\
-                                   .order_by(Message.created_at.asc())\
-                                   .all()
-
-    messages_data = []
-    marked_read_ids = []
-    for message, sender_username, sender_avatar, sender_display_name in messages_with_users:
-        messages_data.append({
-            "id": message.id,
-            "sender_id": message.sender_id,
-            "sender": sender_username,
-            "sender_avatar": sender_avatar,
-            "sender_display_name": sender_display_name,
-            "content": message.content,
-            "image_url": message.image_url,
-            "is_read": message.is_read,
-            "created_at": message.created_at.strftime("%H:%M")
-        })
-
-        # Mark message as read if current user is the receiver
-        if message.receiver_id == current_user_id and not message.is_read:
-            message.is_read = True
-            marked_read_ids.append(message.id)
+    before = request.args.get('before', type=int)
+    try:
+        page = chat_service.query_messages(
+            messenger,
+            before,
+            clamp_page_size(
+                request.args.get('limit'),
+                current_app.config['MESSAGES_PAGE_SIZE'],
+                current_app.config['MESSAGES_MAX_PAGE_SIZE']
+            )
+        )
+    except ChatServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
-    db.session.commit()
+    # Mark the conversation read when it is opened, not on scrollback
+    if before is None:
+        last_read_id = chat_service.mark_read(messenger, current_user_id)
+        db.session.commit()
 
-    # Notify sender that messages were read
-    if marked_read_ids:
-        socketio.emit('messages_read', {'message_ids': marked_read_ids, 'friend_id': current_user_id}, room=f'user_{friend_id}')
+        # Notify sender that messages were read
+        if last_read_id:
+            socketio.emit('messages_read', {'last_read_id': last_read_id, 'friend_id': current_user_id}, room=f'user_{friend_id}')
 
     # Get friend info
     friend = db.session.query(User).get(friend_id)
 
     return jsonify({
-        'messages': messages_data,
+        'messages': page['messages'],
+        'next_cursor': page['next_cursor'],
         'messenger_id': messenger.id,
         'friend': {
             'id': friend.id,
@@ -152,41 +88,55 @@ def send_message_api():
     if not friend:
         return jsonify({'success': False, 'message': 'Friend not found'}), 404
 
-    # Find or create messenger
-    messenger = db.session.query(Messenger).filter(
-        ((current_user_id == Messenger.first_user_id) & (friend_id == Messenger.second_user_id)) |
-        ((friend_id == Messenger.first_user_id) & (current_user_id == Messenger.second_user_id))
-    ).first()
-
-    if not messenger:
-        messenger = Messenger(
-            first_user_id=current_user_id,
-            second_user_id=friend_id
-        )
-        db.session.add(messenger)
-        db.session.flush()
+    image_url = data.get('image_url')
+    pending_images = session.get(PENDING_IMAGES_KEY, [])
+    if image_url and image_url not in pending_images:
+        return jsonify({'success': False, 'message': 'Unknown image'}), 400
 
+    # Find or create messenger
+    messenger = chat_service.get_or_create_messenger(current_user_id, friend_id)
+
+    image_info = {}
+    if image_url:
+        # The message holds the reference to its image
+        try:
+            upload_service.acquire(image_url)
+        except UploadServiceError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 400
+        image_info = upload_service.image_info(image_url)
     new_message = Message(
         sender_id=current_user_id,
         receiver_id=friend_id,
         messenger_id=messenger.id,
         content=content,
-        image_url=data.get('image_url')
+        image_url=image_url,
+        image_variants=image_service.existing_variants(image_url) if image_url else None,
+        **image_info
     )
     db.session.add(new_message)
+    db.session.flush()
+    chat_service.record_message(messenger, new_message)
     db.session.commit()
 
+    if image_url:
+        session[PENDING_IMAGES_KEY] = [url for url in pending_images if url != image_url]
+
     current_user = db.session.query(User).get(current_user_id)
 
     message_json = {
         'id': new_message.id,
         'content': new_message.content,
         'image_url': new_message.image_url,
+        'image_variants': json.loads(new_message.image_variants) if new_message.image_variants else None,
+        'image_width': new_message.image_width,
+        'image_height': new_message.image_height,
+        'image_placeholder': new_message.image_placeholder,
         'sender': current_user.username,
         'sender_avatar': current_user.avatar_path,
         'sender_id': current_user_id,
         'chat_id': messenger.id,
-        'is_read': new_message.is_read,
+        'is_read': False,
         'created_at': new_message.created_at.strftime("%H:%M")
     }
 
@@ -198,27 +148,38 @@ def send_message_api():
 @bp_chat.route("/api/upload_chat_image", methods=['POST'])
 @login_required
 def upload_chat_image():
-    """Upload an image for chat messages"""
-    if 'image' not in request.files:
+    """Upload an image for chat messages, as a file or the upload_id of a
+    finished resumable upload (see /api/uploads)"""
+    upload_id = request.form.get('upload_id')
+    if 'image' not in request.files and not upload_id:
         return jsonify({'success': False, 'message': 'No image file provided'}), 400
+    if 'image' in request.files and upload_id:
+        return jsonify({'success': False, 'message': 'Send either an image or an upload_id, not both'}), 400
 
     try:
-        file = request.files['image']
+        if upload_id:
+            file = upload_service.open_upload(session['user_id'], upload_id)
+        else:
+            file = request.files['image']
 
         # Validate the image
         validated_file = post_service.validate_image(file)
 
-        # Save the image
-        upload_folder = os.path.join('app', 'static', 'uploads', 'chat')
-        os.makedirs(upload_folder, exist_ok=True)
-
-        file_extension = validated_file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        file_path = os.path.join(upload_folder, unique_filename)
+        # Save the image; the reference is taken by the message it is sent
+        # in, until then the sweeper's grace period keeps the file
+        try:
+            image_url = upload_service.store(validated_file, reference=False)
+        finally:
+            if upload_id:
+                file.close()
+        db.session.commit()
+        image_service.process_chat_image(image_url)
 
-        validated_file.save(file_path)
+        pending_images = [url for url in session.get(PENDING_IMAGES_KEY, []) if url != image_url]
+        session[PENDING_IMAGES_KEY] = (pending_images + [image_url])[-MAX_PENDING_IMAGES:]
 
-        image_url = f"uploads/chat/{unique_filename}"
+        if upload_id:
+            upload_service.finish_upload(session['user_id'], upload_id)
 
         return jsonify({
             'success': True,
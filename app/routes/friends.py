@@ -1,10 +1,10 @@
 
 from flask import Blueprint, request, session, jsonify
 from ..helpers import create_notification, clean_notification_data
-from ..models import User, Notification, Messenger
+from ..models import User, Notification
 from ..decorators import login_required
 from .. import db, socketio
-from ..services import user_service, friendship_service, notification_service
+from ..services import user_service, friendship_service, notification_service, chat_service
 
 bp_friends = Blueprint("bp_friends", __name__)
 
@@ -69,11 +69,8 @@ def respond_friend_request():
         if response == 'accept':
             friendship = friendship_service.accept_friend_request(friendship_id, current_user_id)
 
-            new_messenger = Messenger(
-                first_user_id=friendship.requested_id,
-                second_user_id=friendship.requester_id,
-            )
-            db.session.add(new_messenger)
+            # Reuses the conversation if the two were friends before
+            chat_service.get_or_create_messenger(friendship.requested_id, friendship.requester_id)
             db.session.commit()
 
             # Notify the requester that their request was accepted
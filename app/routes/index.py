@@ -1,11 +1,13 @@
-from flask import Blueprint, session, request, jsonify, redirect
+from flask import Blueprint, session, request, jsonify, redirect, current_app
 from .. import socketio
 from ..decorators import login_required
+from ..pagination import clamp_page_size
 import os
 
 from ..services.user_service import UserServiceError
 from ..services.post_service import PostServiceError
-from ..services import user_service, post_service
+from ..services.upload_service import UploadServiceError
+from ..services import user_service, post_service, like_buffer, upload_service
 
 bp_index = Blueprint("bp_index", __name__)
 
@@ -14,18 +16,53 @@ bp_index = Blueprint("bp_index", __name__)
 def index():
     return jsonify({"success": True})
 
+def _page_args():
+    """Read keyset pagination arguments from the query string"""
+    return {
+        'before': request.args.get('before'),
+        'after': request.args.get('after'),
+        'limit': clamp_page_size(
+            request.args.get('limit'),
+            current_app.config['POSTS_PAGE_SIZE'],
+            current_app.config['POSTS_MAX_PAGE_SIZE']
+        )
+    }
+
 @bp_index.route('/api/posts')
 @login_required
 def get_posts():
     try:
         user = user_service.get_user(session['user_id'])
-        posts = post_service.query_posts()
+        page = post_service.query_posts(current_user_id=session['user_id'], **_page_args())
         return jsonify({
             'success': True,
-            'posts': posts,
+            'posts': page['posts'],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
             'current_user_id': session.get('user_id'),
             'current_username': user.username
         })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp_index.route('/api/timeline')
+@login_required
+def get_timeline():
+    try:
+        user = user_service.get_user(session['user_id'])
+        page = post_service.query_timeline(session['user_id'], **_page_args())
+        return jsonify({
+            'success': True,
+            'posts': page['posts'],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'current_user_id': session.get('user_id'),
+            'current_username': user.username
+        })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -35,7 +72,14 @@ def profile(username):
     try:
         user = user_service.get_user_by_name(username)
         current_user = user_service.get_user(session['user_id'])
-        posts = post_service.query_posts(profile_user_id=int(user.id))
+        page = post_service.query_posts(
+            profile_user_id=int(user.id),
+            current_user_id=session['user_id'],
+            **_page_args()
+        )
+
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 404
@@ -48,7 +92,9 @@ def profile(username):
         'bio': user.bio,
         'avatar_path': user.avatar_path,
         'is_online': user.is_online,
-        'posts': posts,
+        'posts': page['posts'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
         'current_user_id': session.get('user_id'),
         'current_username': current_user.username
     })
@@ -61,28 +107,45 @@ def upload_image():
         try:
             user = user_service.get_user(session['user_id'])
             description = request.form.get('description', '').strip() or None
+            # A finished resumable upload (see /api/uploads) instead of a file
+            upload_id = request.form.get('upload_id')
+            if upload_id and 'image' in request.files:
+                return jsonify({'success': False, 'message': 'Send either an image or an upload_id, not both'}), 400
 
             # Allow posts with just text or just image or both
             file = None
             if 'image' in request.files and request.files['image'].filename:
                 file = post_service.validate_image(request.files["image"])
+            elif upload_id:
+                file = post_service.validate_image(upload_service.open_upload(user.id, upload_id))
 
             # Must have either image or description
             if not file and not description:
                 return jsonify({'success': False, 'message': 'Post must have either text or image'}), 400
 
-            new_post = post_service.create_post(user.id, file, description)
+            try:
+                new_post = post_service.create_post(user.id, file, description)
+            finally:
+                if upload_id and file:
+                    file.close()
+
+            if upload_id:
+                upload_service.finish_upload(user.id, upload_id)
 
         except PostServiceError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
 
+        except UploadServiceError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
         except UserServiceError as e:
             return jsonify({'success': False, 'message': str(e)}), 400
 
         #future pub/sub
         friends_query = user_service.get_user_friends(user.id)
+        post_data = new_post.to_dict()
         owner_socket_post_data = {
-            "post_data": new_post.to_dict(),
+            "post_data": post_data,
             "owner": user.username,
             "post_id": new_post.id,
             "current_user_id": user.id
@@ -92,7 +155,7 @@ def upload_image():
         # Send to friends
         for friend in friends_query:
             friend_socket_post_data = {
-                "post_data": new_post.to_dict(),
+                "post_data": post_data,
                 "owner": user.username,
                 "post_id": new_post.id,
                 "current_user_id": friend["id"]
@@ -126,45 +189,59 @@ def delete_post():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 404
 
-@bp_index.route("/api/like_post/<post_id>", methods=["POST"])
+@bp_index.route("/api/like_post/<int:post_id>", methods=["POST"])
 @login_required
 def like_post(post_id):
     try:
-        post_likes = post_service.query_post_likes(post_id)
         user_id = session["user_id"]
-        user = user_service.get_user(user_id)
-
-        #unlike if already liked
-        for like in post_likes:
-            if like.user_id == user_id:
-                post_service.remove_like(like.id)
-                new_count = len(post_likes) - 1
-
-                # Emit socket event for unlike
-                socketio.emit('post_unliked', {
-                    'post_id': int(post_id),
-                    'like_count': new_count,
-                    'user_id': user_id
-                })
-
-                return f'{new_count}'
-
-        post_service.create_like(user_id, post_id)
-        new_count = len(post_likes) + 1
-
-        # Emit socket event for like
-        socketio.emit('post_liked', {
-            'post_id': int(post_id),
-            'like_count': new_count,
-            'user_id': user_id,
-            'username': user.username
-        })
+
+        if like_buffer.enabled:
+            # Written and broadcast (post_like_count) by the next buffer flush
+            liked, new_count = like_buffer.toggle(user_id, post_id)
+            return f'{new_count}'
+
+        liked, new_count = post_service.toggle_like(user_id, post_id)
+
+        if liked:
+            # Emit socket event for like
+            socketio.emit('post_liked', {
+                'post_id': post_id,
+                'like_count': new_count,
+                'user_id': user_id,
+                'username': session.get('username')
+            })
+        else:
+            # Emit socket event for unlike
+            socketio.emit('post_unliked', {
+                'post_id': post_id,
+                'like_count': new_count,
+                'user_id': user_id
+            })
 
         return f'{new_count}'
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 404
 
+@bp_index.route("/api/posts/<int:post_id>/likes")
+@login_required
+def get_post_likes(post_id):
+    try:
+        limit = clamp_page_size(
+            request.args.get('limit'),
+            current_app.config['POSTS_PAGE_SIZE'],
+            current_app.config['POSTS_MAX_PAGE_SIZE']
+        )
+        page = post_service.query_post_likers(post_id, request.args.get('before'), limit)
+        return jsonify({
+            'success': True,
+            'post_id': post_id,
+            'likers': page['likers'],
+            'next_cursor': page['next_cursor']
+        })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
 @bp_index.route("/api/comment/<int:post_id>", methods=["POST"])
 @login_required
 def create_comment(post_id):
@@ -207,20 +284,67 @@ def create_comment(post_id):
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to post comment'}), 500
 
+def _comment_page_args():
+    """Read comment pagination arguments from the query string"""
+    return {
+        'after': request.args.get('after'),
+        'limit': clamp_page_size(
+            request.args.get('limit'),
+            current_app.config['COMMENTS_PAGE_SIZE'],
+            current_app.config['COMMENTS_MAX_PAGE_SIZE']
+        )
+    }
+
 @bp_index.route("/api/comments/<int:post_id>", methods=["GET"])
 @login_required
 def get_comments(post_id):
     try:
-        comments = post_service.get_post_comments(post_id)
+        page = post_service.query_comment_page(post_id, **_comment_page_args())
         return jsonify({
             'success': True,
-            'comments': [comment.to_dict() for comment in comments],
+            'comments': page['comments'],
+            'next_cursor': page['next_cursor'],
             'post_id': post_id,
             'current_user_id': session['user_id']
         })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to load comments'}), 500
 
+@bp_index.route("/api/comment/<int:comment_id>/replies", methods=["GET"])
+@login_required
+def get_comment_replies(comment_id):
+    try:
+        page = post_service.query_comment_replies(comment_id, **_comment_page_args())
+        return jsonify({
+            'success': True,
+            'replies': page['comments'],
+            'next_cursor': page['next_cursor'],
+            'total_reply_count': page['total_reply_count'],
+            'comment_id': comment_id,
+            'post_id': page['post_id'],
+            'current_user_id': session['user_id']
+        })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'message': 'Failed to load replies'}), 500
+
+@bp_index.route("/api/comment/<int:comment_id>/thread", methods=["GET"])
+@login_required
+def get_comment_thread(comment_id):
+    try:
+        return jsonify({
+            'success': True,
+            'comment': post_service.get_comment_subtree(comment_id),
+            'current_user_id': session['user_id']
+        })
+    except PostServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'message': 'Failed to load comment'}), 500
+
 @bp_index.route("/api/comment/<int:comment_id>", methods=["DELETE"])
 @login_required
 def delete_comment(comment_id):
@@ -0,0 +1,81 @@
+from flask import Blueprint, current_app, request, send_file, abort
+from werkzeug.security import safe_join
+import mimetypes
+import os
+from ..services.image_service import STATIC_ROOT, VARIANT_EXTENSIONS, MODERN_FORMATS, alternate_path
+from ..services.upload_service import UPLOAD_FOLDER
+
+bp_media = Blueprint("bp_media", __name__)
+
+def _negotiate(path, file_path):
+    """Pick the best encoding of a variant the client explicitly accepts.
+    Returns (path, file_path, negotiable)."""
+    if path.rsplit('.', 1)[-1] not in VARIANT_EXTENSIONS:
+        return path, file_path, False
+
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    for _, extension, mimetype, _ in MODERN_FORMATS:
+        if mimetype in accepted and os.path.isfile(alternate_path(file_path, extension)):
+            return alternate_path(path, extension), alternate_path(file_path, extension), True
+
+    return path, file_path, True
+
+def _cache_forever(response):
+    """Uploads are content addressed, so a URL never changes its bytes"""
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+@bp_media.route('/media/<path:path>')
+def get_media(path):
+    """Serve an uploaded image (image_path, avatar_path, image_url or one of
+    their variants) with immutable caching, a strong ETag, Last-Modified and
+    conditional/Range support. Variants are sent as AVIF/WebP when the Accept
+    header allows it. With MEDIA_SENDFILE set, only headers are produced and
+    the front proxy sends the file itself."""
+    folder, _, name = path.partition('/')
+    if folder != UPLOAD_FOLDER:
+        abort(404)
+
+    # Joined below the upload folder so '..' cannot reach the rest of static
+    file_path = safe_join(STATIC_ROOT, UPLOAD_FOLDER, name)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+
+    path, file_path, negotiable = _negotiate(path, file_path)
+
+    # The filename is the content hash (or a unique name for older uploads)
+    # plus the encoding, which makes it a strong validator on its own
+    etag = os.path.basename(path)
+    last_modified = os.path.getmtime(file_path)
+    mode = current_app.config['MEDIA_SENDFILE']
+
+    if mode not in ('x-accel', 'x-sendfile'):
+        response = send_file(
+            file_path,
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=current_app.config['MEDIA_MAX_AGE']
+        )
+        if negotiable:
+            response.vary.add('Accept')
+        return _cache_forever(response)
+
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    )
+    if mode == 'x-accel':
+        # nginx: an internal location mapped onto the static folder
+        response.headers['X-Accel-Redirect'] = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/') + '/' + path
+    else:
+        response.headers['X-Sendfile'] = file_path
+
+    if negotiable:
+        response.vary.add('Accept')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    _cache_forever(response)
+    # Answer If-None-Match/If-Modified-Since here; the proxy handles Range
+    return response.make_conditional(request)
@@ -0,0 +1,64 @@
+from flask import Blueprint, session, request, jsonify
+from ..decorators import login_required
+from ..services.upload_service import UploadServiceError, UploadOffsetError
+from ..services import upload_service
+
+bp_uploads = Blueprint("bp_uploads", __name__)
+
+# Resumable uploads: create a session, PUT the bytes in chunks, then pass
+# the upload_id to /upload_image or /api/upload_chat_image instead of a file.
+
+@bp_uploads.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    data = request.get_json() or {}
+
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid size'}), 400
+
+    try:
+        upload = upload_service.create_session(session['user_id'], data.get('filename'), size)
+        return jsonify({'success': True, **upload}), 200
+
+    except UploadServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@bp_uploads.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    try:
+        upload = upload_service.get_session(session['user_id'], upload_id)
+        return jsonify({'success': True, **upload}), 200
+
+    except UploadServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+
+@bp_uploads.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def put_upload_chunk(upload_id):
+    """Append the raw request body at ?offset=<bytes received so far>"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': 'Missing offset'}), 400
+
+    try:
+        upload = upload_service.write_chunk(session['user_id'], upload_id, offset, request.stream)
+        return jsonify({'success': True, **upload}), 200
+
+    except UploadOffsetError as e:
+        return jsonify({'success': False, 'message': str(e), 'offset': e.offset}), 409
+
+    except UploadServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@bp_uploads.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def delete_upload(upload_id):
+    try:
+        upload_service.finish_upload(session['user_id'], upload_id)
+        return jsonify({'success': True}), 200
+
+    except UploadServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
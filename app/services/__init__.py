@@ -3,12 +3,24 @@ from .post_service import PostService
 from .friendship_service import FriendshipService
 from .notifcation_service import NotificationService
 from .user_settings_service import UserSettingsService
+from .timeline_service import TimelineService
+from .like_buffer import LikeBuffer
+from .image_service import ImageService
+from .upload_service import UploadService
+from .upload_sweeper import UploadSweeper
+from .chat_service import ChatService
 
 user_service = None
 post_service = None
 friendship_service = None
 notification_service = None
 user_settings_service = None
+timeline_service = None
+like_buffer = None
+image_service = None
+upload_service = None
+upload_sweeper = None
+chat_service = None
 
 def init_services(db):
 
@@ -17,9 +29,21 @@ def init_services(db):
     global friendship_service
     global notification_service
     global user_settings_service
+    global timeline_service
+    global like_buffer
+    global image_service
+    global upload_service
+    global upload_sweeper
+    global chat_service
 
     user_service = UserService(db)
     post_service = PostService(db)
     friendship_service = FriendshipService(db)
     notification_service = NotificationService(db)
     user_settings_service = UserSettingsService(db)
+    timeline_service = TimelineService(db)
+    like_buffer = LikeBuffer(db)
+    image_service = ImageService(db)
+    upload_service = UploadService(db)
+    upload_sweeper = UploadSweeper(db)
+    chat_service = ChatService(db)
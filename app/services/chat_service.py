@@ -0,0 +1,196 @@
+from flask import json
+from sqlalchemy import case, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from ..models import User, Friendship, Messenger, Message, user_pair
+
+# Longest message text kept in a conversation's inbox preview
+PREVIEW_LENGTH = 255
+
+class ChatServiceError(Exception): pass
+
+def message_preview(message):
+    """Inbox line for a message"""
+    if message.image_url and not message.content:
+        preview = "📷 Image"
+    elif message.image_url and message.content:
+        preview = f"📷 {message.content}"
+    else:
+        preview = message.content or ''
+    return preview[:PREVIEW_LENGTH]
+
+class ChatService:
+    """Keeps each Messenger's conversation summary (last message, and per
+    participant a read cursor and unread count) in step with its messages, so
+    the inbox and read receipts are served from the summaries instead of the
+    message table.
+
+    A message is read once its receiver's cursor is at or past its id. The
+    unread count is the number of messages received since the cursor last
+    moved: record_message adds to it and mark_read resets it together with
+    the cursor."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def find_messenger(self, user1_id, user2_id):
+        """The conversation between two users, or None"""
+        low_user_id, high_user_id = user_pair(user1_id, user2_id)
+        return Messenger.query.filter_by(low_user_id=low_user_id, high_user_id=high_user_id).first()
+
+    def get_or_create_messenger(self, user_id, friend_id):
+        """The conversation between two users, created (and flushed) in the
+        caller's transaction if there is none yet"""
+        messenger = self.find_messenger(user_id, friend_id)
+        if messenger:
+            return messenger
+
+        try:
+            with self.db.session.begin_nested():
+                messenger = Messenger(first_user_id=user_id, second_user_id=friend_id)
+                self.db.session.add(messenger)
+            return messenger
+        except IntegrityError:
+            # The other user opened the conversation at the same time
+            return self.find_messenger(user_id, friend_id)
+
+    def _unread_column(self, messenger, user_id):
+        """The messenger's unread counter for one of its participants"""
+        if messenger.first_user_id == user_id:
+            return Messenger.first_user_unread
+        return Messenger.second_user_unread
+
+    def record_message(self, messenger, message):
+        """Update the summary for a message just added (and flushed) to the
+        conversation, in the caller's transaction"""
+        unread = self._unread_column(messenger, message.receiver_id)
+        self.db.session.execute(
+            update(Messenger).where(Messenger.id == messenger.id).values({
+                Messenger.last_message_id: message.id,
+                Messenger.last_message_preview: message_preview(message),
+                Messenger.last_message_at: message.created_at,
+                unread: unread + 1
+            })
+        )
+
+    def _cursor_column(self, messenger, user_id):
+        """The messenger's read cursor for one of its participants"""
+        if messenger.first_user_id == user_id:
+            return Messenger.first_user_last_read_message_id
+        return Messenger.second_user_last_read_message_id
+
+    def is_read(self, messenger, message):
+        """Whether the message's receiver has read up to it"""
+        if messenger.first_user_id == message.receiver_id:
+            cursor = messenger.first_user_last_read_message_id
+        else:
+            cursor = messenger.second_user_last_read_message_id
+        return cursor is not None and message.id <= cursor
+
+    def mark_read(self, messenger, user_id):
+        """Move the user's read cursor to the conversation's last message and
+        reset their unread count, as one row write in the caller's
+        transaction. Returns the new cursor, or None if it was already there."""
+        cursor = self._cursor_column(messenger, user_id)
+        unread = self._unread_column(messenger, user_id)
+
+        # Both come from the same row in one statement, so a message recorded
+        # concurrently is either read here or counted as unread afterwards
+        result = self.db.session.execute(
+            update(Messenger).where(
+                Messenger.id == messenger.id,
+                Messenger.last_message_id.isnot(None),
+                or_(cursor.is_(None), cursor < Messenger.last_message_id)
+            ).values({cursor: Messenger.last_message_id, unread: 0})
+        )
+        if not result.rowcount:
+            return None
+
+        return self.db.session.execute(select(cursor).where(Messenger.id == messenger.id)).scalar()
+
+    def query_messages(self, messenger, before=None, limit=50):
+        """Return one page of a conversation, oldest first.
+
+        Pages are keyset based on (created_at, id) over the
+        (messenger_id, created_at, id) index, newest page first; `before` is
+        the message id returned as next_cursor by the previous page.
+        """
+        query = self.db.session.query(Message, User.username, User.avatar_path, User.display_name)\
+                               .join(User, Message.sender_id == User.id)\
+                               .filter(Message.messenger_id == messenger.id)
+
+        if before is not None:
+            anchor = self.db.session.execute(
+                select(Message.created_at).where(Message.id == before, Message.messenger_id == messenger.id)
+            ).scalar()
+            if anchor is None:
+                raise ChatServiceError(f"Invalid cursor: {before}")
+            query = query.filter(tuple_(Message.created_at, Message.id) < (anchor, before))
+
+        rows = query.order_by(Message.created_at.desc(), Message.id.desc())\
+                    .limit(limit + 1)\
+                    .all()
+
+        page = rows[:limit]
+        page.reverse()
+        messages = [
+            {
+                "id": message.id,
+                "sender_id": message.sender_id,
+                "sender": sender_username,
+                "sender_avatar": sender_avatar,
+                "sender_display_name": sender_display_name,
+                "content": message.content,
+                "image_url": message.image_url,
+                "image_variants": json.loads(message.image_variants) if message.image_variants else None,
+                "image_width": message.image_width,
+                "image_height": message.image_height,
+                "image_placeholder": message.image_placeholder,
+                "is_read": self.is_read(messenger, message),
+                "created_at": message.created_at.strftime("%H:%M")
+            }
+            for message, sender_username, sender_avatar, sender_display_name in page
+        ]
+        next_cursor = page[0][0].id if len(rows) > limit else None
+
+        return {'messages': messages, 'next_cursor': next_cursor}
+
+    def get_inbox(self, user_id):
+        """The user's friends with their conversation summaries, most recent
+        conversation first, in one query"""
+        is_first = Messenger.first_user_id == user_id
+        rows = self.db.session.query(
+            User,
+            Messenger.id,
+            Messenger.last_message_preview,
+            Messenger.last_message_at,
+            case((is_first, Messenger.first_user_unread), else_=Messenger.second_user_unread)
+        ).join(
+            Friendship, (User.id == Friendship.requester_id) | (User.id == Friendship.requested_id)
+        ).outerjoin(
+            Messenger, (Messenger.low_user_id == Friendship.low_user_id) &
+                       (Messenger.high_user_id == Friendship.high_user_id)
+        ).filter(
+            Friendship.status == 'accepted',
+            ((Friendship.requester_id == user_id) | (Friendship.requested_id == user_id)),
+            User.id != user_id
+        ).order_by(
+            Messenger.last_message_at.is_(None),
+            Messenger.last_message_at.desc(),
+            User.id
+        ).all()
+
+        inbox = []
+        for friend, messenger_id, preview, last_message_at, unread_count in rows:
+            inbox.append({
+                'id': friend.id,
+                'username': friend.username,
+                'avatar_path': friend.avatar_path,
+                'display_name': friend.display_name,
+                'is_online': friend.is_online,
+                'last_message': preview if last_message_at else 'No messages yet',
+                'timestamp': last_message_at.strftime("%H:%M") if last_message_at else '',
+                'messenger_id': messenger_id,
+                'unread_count': unread_count or 0
+            })
+
+        return inbox
@@ -1,4 +1,5 @@
-from ..models import User, Friendship
+from sqlalchemy.exc import IntegrityError
+from ..models import User, Friendship, user_pair
 
 class FriendshipServiceError(Exception):
     pass
@@ -9,10 +10,8 @@ class FriendshipService:
 
     def find_friendship(self, user1_id, user2_id, status=None):
         """Find friendship between two users (handles bidirectional relationship)"""
-        query = Friendship.query.filter(
-            ((Friendship.requester_id == user1_id) & (Friendship.requested_id == user2_id)) |
-            ((Friendship.requester_id == user2_id) & (Friendship.requested_id == user1_id))
-        )
+        low_user_id, high_user_id = user_pair(user1_id, user2_id)
+        query = Friendship.query.filter_by(low_user_id=low_user_id, high_user_id=high_user_id)
         if status:
             query = query.filter(Friendship.status == status)
         return query.first()
@@ -83,7 +82,13 @@ class FriendshipService:
             status='pending'
         )
 
-        self.db.session.add(new_friendship)
+        try:
+            with self.db.session.begin_nested():
+                self.db.session.add(new_friendship)
+        except IntegrityError:
+            # Both users sent a request to each other at the same time
+            raise FriendshipServiceError('Friendship already exists or pending')
+
         self.db.session.commit()
         return new_friendship
 
@@ -99,6 +104,10 @@ class FriendshipService:
             raise FriendshipServiceError('Friend request not found')
 
         friendship.status = 'accepted'
+
+        from ..services import timeline_service
+        timeline_service.on_friendship_added(friendship.requester_id, friendship.requested_id)
+
         self.db.session.commit()
         return friendship
 
@@ -144,5 +153,10 @@ class FriendshipService:
             raise FriendshipServiceError('Friendship not found')
 
         self.db.session.delete(friendship)
+        self.db.session.flush()
+
+        from ..services import timeline_service
+        timeline_service.on_friendship_removed(current_user_id, friend_user_id)
+
         self.db.session.commit()
         return True
\ No newline at end of file
@@ -0,0 +1,254 @@
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from flask import current_app, json
+from sqlalchemy import update
+import base64
+import io
+import os
+import threading
+from ..models import Post, User, Message, UploadBlob
+
+# The app's static folder, found from this package rather than the working
+# directory so that workers, scripts and the media route all use one root
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+# Variant name -> longest edge in pixels
+VARIANTS = {
+    'thumb': 320,
+    'feed': 1080,
+    'full': 2048
+}
+
+# Longest edge of the inline placeholder preview
+PLACEHOLDER_SIZE = 20
+EXIF_ORIENTATION = 0x0112
+
+# Extensions a variant can be recorded with
+VARIANT_EXTENSIONS = ('jpg', 'png')
+
+# Modern encodings written next to every variant, best first, as
+# (Pillow format, extension, mimetype, save options). The media endpoint
+# serves one of them when the request's Accept header allows it.
+MODERN_FORMATS = [
+    ('AVIF', 'avif', 'image/avif', {'quality': 60}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4})
+]
+
+# Every extension a variant file can have on disk
+VARIANT_FILE_EXTENSIONS = VARIANT_EXTENSIONS + tuple(image_format[1] for image_format in MODERN_FORMATS)
+
+class ImageServiceError(Exception): pass
+
+def variant_path(image_path, name, extension):
+    """Static-relative path of one variant, stored next to the original"""
+    base = image_path.rsplit('.', 1)[0]
+    return f"{base}_{name}.{extension}"
+
+def alternate_path(path, extension):
+    """Path of the same variant in another encoding"""
+    return f"{path.rsplit('.', 1)[0]}.{extension}"
+
+def modern_formats():
+    """MODERN_FORMATS this Pillow build can encode (AVIF needs a recent
+    Pillow or the pillow-avif-plugin)"""
+    Image.init()
+    return [image_format for image_format in MODERN_FORMATS if image_format[0] in Image.SAVE]
+
+def _save(img, path, image_format, **save_options):
+    """Write img to static-relative path through a temp file"""
+    target = os.path.join(STATIC_ROOT, path)
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    img.save(tmp_target, image_format, **save_options)
+    os.replace(tmp_target, target)
+
+def displayed_size(img):
+    """(width, height) of an opened image as it is displayed, i.e. after EXIF
+    orientation. Only reads the header; a quarter-turn orientation swaps them."""
+    width, height = img.size
+    if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+        width, height = height, width
+    return width, height
+
+def placeholder_uri(img):
+    """Data URI of a tiny JPEG preview of a decoded image, a few hundred
+    bytes, to show while the image loads"""
+    preview = img.convert('RGB')
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+
+    buffer = io.BytesIO()
+    preview.save(buffer, 'JPEG', quality=50)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def render_variants(image_path):
+    """Decode an upload once, write every resized variant and make its
+    placeholder.
+
+    Applies the EXIF orientation and re-encodes without metadata. Images
+    with transparency become PNG, everything else JPEG, and each variant is
+    also written in every supported modern format. Animated images only get
+    a placeholder of their first frame. Runs in a worker process, so it only
+    touches the filesystem.
+    Returns ({variant name: static-relative path}, placeholder).
+    """
+    source = os.path.join(STATIC_ROOT, image_path)
+
+    with Image.open(source) as img:
+        animated = getattr(img, 'is_animated', False)
+        img = ImageOps.exif_transpose(img)
+        placeholder = placeholder_uri(img)
+        if animated:
+            return {}, placeholder
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        extension, image_format = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+
+        alternates = modern_formats()
+        variants = {}
+        for name, size in VARIANTS.items():
+            resized = img.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+
+            path = variant_path(image_path, name, extension)
+
+            # The JPEG/PNG is written last: existing_variants() takes it
+            # as the sign that all encodings of the variant are on disk
+            for alternate_format, alternate_extension, _, alternate_options in alternates:
+                _save(resized, alternate_path(path, alternate_extension), alternate_format, **alternate_options)
+
+            save_options = {'optimize': True}
+            if image_format == 'JPEG':
+                save_options.update(quality=85, progressive=True)
+            _save(resized, path, image_format, **save_options)
+
+            variants[name] = path
+
+        return variants, placeholder
+
+class ImageService:
+    """Produces resized image variants in a worker process pool.
+
+    Uploads are saved as-is by the request, then handed to the pool; when the
+    variants are written their paths are recorded next to image_path,
+    avatar_path or image_url, and the placeholder on the upload's blob and
+    the posts and messages showing it, so request threads never decode
+    the image.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.app = None
+        self.executor = None
+        self._executor_lock = threading.Lock()
+
+    def start(self, app):
+        """Attach to this app; the worker pool is created on first use, so
+        scripts that never render an image do not spawn it"""
+        self.app = app
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.app.config['IMAGE_WORKERS'])
+            return self.executor
+
+    def _submit(self, image_path, record):
+        """Render variants for image_path and pass them to record() when done.
+        Nothing is rendered for bytes that already have variants; callers copy
+        those onto their row with existing_variants() before they commit."""
+        if not self.app:
+            return
+
+        # Uploads are deduplicated, so the same bytes may already be
+        # rendered; callers copy those in with existing_variants()
+        if self.existing_variants(image_path):
+            return
+
+        def on_done(future):
+            try:
+                variants, placeholder = future.result()
+                with self.app.app_context():
+                    if variants:
+                        record(json.dumps(variants))
+                    self._record_placeholder(image_path, placeholder)
+                    self.db.session.commit()
+            except Exception as e:
+                self.app.logger.error(f'Image processing failed for {image_path}: {e}')
+                with self.app.app_context():
+                    self.db.session.rollback()
+
+        self._get_executor().submit(render_variants, image_path).add_done_callback(on_done)
+
+    def _record_placeholder(self, image_path, placeholder):
+        """Store a placeholder on the blob and on every post or message that
+        was created before it was ready"""
+        self.db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == image_path, UploadBlob.placeholder.is_(None))
+            .values(placeholder=placeholder)
+        )
+        self.db.session.execute(
+            update(Post)
+            .where(Post.image_path == image_path, Post.image_placeholder.is_(None))
+            .values(image_placeholder=placeholder, updated_at=Post.updated_at)
+        )
+        self.db.session.execute(
+            update(Message)
+            .where(Message.image_url == image_path, Message.image_placeholder.is_(None))
+            .values(image_placeholder=placeholder)
+        )
+
+    def process_post_image(self, post_id, image_path):
+        self._submit(image_path, lambda variants: self.db.session.execute(
+            update(Post)
+            .where(Post.id == post_id, Post.image_path == image_path)
+            .values(image_variants=variants, updated_at=Post.updated_at)
+        ))
+
+    def process_avatar(self, user_id, avatar_path):
+        # Only record the variants if the avatar was not replaced meanwhile
+        self._submit(avatar_path, lambda variants: self.db.session.execute(
+            update(User)
+            .where(User.id == user_id, User.avatar_path == avatar_path)
+            .values(avatar_variants=variants)
+        ))
+
+    def process_chat_image(self, image_url):
+        # The message may not exist yet; send_message picks up finished
+        # variants from disk with existing_variants()
+        self._submit(image_url, lambda variants: self.db.session.execute(
+            update(Message)
+            .where(Message.image_url == image_url)
+            .values(image_variants=variants)
+        ))
+
+    def existing_variants(self, image_path):
+        """Variants already written for image_path, as JSON, or None"""
+        for extension in VARIANT_EXTENSIONS:
+            variants = {
+                name: variant_path(image_path, name, extension)
+                for name in VARIANTS
+            }
+            if all(os.path.exists(os.path.join(STATIC_ROOT, path)) for path in variants.values()):
+                return json.dumps(variants)
+        return None
+
+    def delete_image(self, image_path, variants=None):
+        """Remove an upload and its variants from disk, ignoring missing files.
+        Variants still being rendered when the row is deleted are not recorded
+        yet, so every path they could have is removed as well."""
+        paths = [image_path] + [
+            variant_path(image_path, name, extension)
+            for name in VARIANTS
+            for extension in VARIANT_FILE_EXTENSIONS
+        ]
+        if variants:
+            paths.extend(json.loads(variants).values())
+
+        for path in paths:
+            file_path = os.path.join(STATIC_ROOT, path)
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except OSError as e:
+                current_app.logger.warning(f"Failed to delete {file_path}: {e}")
@@ -0,0 +1,195 @@
+import atexit
+import threading
+from sqlalchemy import delete, insert, select, update
+from ..models import Post, PostLike
+
+class LikeBufferError(Exception): pass
+
+class LikeBuffer:
+    """Coalesces like/unlike toggles per post and writes them in batches.
+
+    Toggles are recorded in memory as the liker's final intent. Every
+    LIKE_BUFFER_WINDOW_MS the buffer applies all pending intents in one
+    transaction and emits a single `post_like_count` event per touched post,
+    instead of one commit and one broadcast per click. Each post is written
+    in its own savepoint, intents that could not be committed go back into
+    the buffer, and the buffer is flushed once more when the process exits.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.app = None
+        self.window = 0.3
+        self._lock = threading.Lock()
+        # {post_id: {user_id: (liked_in_db, liked)}}
+        self._pending = {}
+        # Intents taken by the flush in progress, same shape
+        self._inflight = {}
+
+    @property
+    def enabled(self):
+        return self.app is not None
+
+    def start(self, app):
+        """Start the background flush loop for this app"""
+        from .. import socketio
+
+        self.app = app
+        self.window = app.config['LIKE_BUFFER_WINDOW_MS'] / 1000
+        socketio.start_background_task(self._run)
+        atexit.register(self._flush_on_exit)
+
+    def _flush_on_exit(self):
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            self.app.logger.error(f'Like buffer flush at shutdown failed: {e}')
+
+    def _run(self):
+        from .. import socketio
+
+        while True:
+            socketio.sleep(self.window)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                self.app.logger.error(f'Like buffer flush failed: {e}')
+
+    def toggle(self, user_id, post_id):
+        """Record a toggle and return (liked, estimated like_count)"""
+        liked_in_db = self.db.session.execute(
+            select(PostLike.id).where(
+                PostLike.post_id == post_id,
+                PostLike.user_id == user_id
+            )
+        ).first() is not None
+        like_count = self.db.session.execute(
+            select(Post.like_count).where(Post.id == post_id)
+        ).scalar()
+        if like_count is None:
+            raise LikeBufferError("Post not found")
+
+        with self._lock:
+            post_pending = self._pending.setdefault(post_id, {})
+            # The latest intent may still be on its way to the database
+            previous = post_pending.get(user_id) or self._inflight.get(post_id, {}).get(user_id)
+            if previous:
+                liked_in_db, liked = previous
+                liked = not liked
+            else:
+                liked = not liked_in_db
+            post_pending[user_id] = (liked_in_db, liked)
+
+            pending_delta = sum(
+                int(now) - int(before) for before, now in post_pending.values()
+            )
+
+        return liked, like_count + pending_delta
+
+    def pending_intents(self, user_id, post_ids):
+        """The user's buffered like state for any of the posts, {post_id: liked}"""
+        intents = {}
+        with self._lock:
+            for buffered in (self._inflight, self._pending):
+                for post_id in post_ids:
+                    if user_id in buffered.get(post_id, {}):
+                        intents[post_id] = buffered[post_id][user_id][1]
+        return intents
+
+    def flush(self):
+        """Apply every pending toggle in one transaction and broadcast counts"""
+        from flask import current_app
+        from .. import socketio
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._inflight = pending
+
+        if not pending:
+            return
+
+        try:
+            for post_id, intents in pending.items():
+                try:
+                    with self.db.session.begin_nested():
+                        self._apply(post_id, intents)
+                except Exception:
+                    # Keep every intent of the post that can be written
+                    for user_id, intent in intents.items():
+                        try:
+                            with self.db.session.begin_nested():
+                                self._apply(post_id, {user_id: intent})
+                        except Exception as e:
+                            current_app.logger.warning(
+                                f'Dropped like toggle of user {user_id} on post {post_id}: {e}'
+                            )
+
+            self.db.session.commit()
+
+        except Exception as e:
+            self.db.session.rollback()
+            self._restore(pending)
+            raise LikeBufferError(e)
+
+        finally:
+            with self._lock:
+                self._inflight = {}
+
+        counts = self.db.session.execute(
+            select(Post.id, Post.like_count).where(Post.id.in_(list(pending)))
+        ).all()
+        for post_id, like_count in counts:
+            socketio.emit('post_like_count', {
+                'post_id': post_id,
+                'like_count': like_count
+            })
+
+    def _restore(self, pending):
+        """Put intents back after a failed flush; toggles made since win"""
+        with self._lock:
+            for post_id, intents in pending.items():
+                post_pending = self._pending.setdefault(post_id, {})
+                for user_id, intent in intents.items():
+                    post_pending.setdefault(user_id, intent)
+
+    def _apply(self, post_id, intents):
+        """Write one post's intents and adjust its like_count"""
+        if self.db.session.get(Post, post_id) is None:
+            raise LikeBufferError("Post not found")
+
+        to_like = [user_id for user_id, (_, liked) in intents.items() if liked]
+        to_unlike = [user_id for user_id, (_, liked) in intents.items() if not liked]
+        delta = 0
+
+        if to_unlike:
+            delta -= self.db.session.execute(
+                delete(PostLike).where(
+                    PostLike.post_id == post_id,
+                    PostLike.user_id.in_(to_unlike)
+                )
+            ).rowcount
+
+        if to_like:
+            already_liked = set(self.db.session.execute(
+                select(PostLike.user_id).where(
+                    PostLike.post_id == post_id,
+                    PostLike.user_id.in_(to_like)
+                )
+            ).scalars())
+            new_likes = [
+                {'post_id': post_id, 'user_id': user_id}
+                for user_id in to_like if user_id not in already_liked
+            ]
+            if new_likes:
+                self.db.session.execute(insert(PostLike), new_likes)
+                delta += len(new_likes)
+
+        if delta:
+            self.db.session.execute(
+                update(Post).where(Post.id == post_id).values({
+                    Post.like_count: Post.like_count + delta,
+                    Post.updated_at: Post.updated_at
+                })
+            )
@@ -1,8 +1,10 @@
-from PIL import Image
-import os
-import uuid
+from flask import current_app
+from sqlalchemy import delete, func, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
-from ..models import Post, User, PostLike, PostComment
+from ..models import Post, User, PostLike, PostComment, TimelineEntry
+from ..pagination import encode_cursor, decode_cursor
+from .upload_service import UploadServiceError
 
 from .user_service import UserService
 from ..services import user_service
@@ -14,69 +16,278 @@ class PostService:
     def __init__(self, db):
         self.db = db
 
-    def query_posts(self, profile_user_id=None):
+    def query_posts(self, profile_user_id=None, current_user_id=None, before=None, after=None, limit=50):
+        """Return one page of posts, newest first.
+
+        Pages are keyset based on (created_at, id): `before` fetches posts older
+        than the cursor and `after` fetches posts newer than it, so every page
+        costs one index range scan no matter how deep the client has scrolled.
+        """
         try:
+            query = self.db.session.query(Post).options(joinedload(Post.owner_user))
             if profile_user_id:
-                posts = self.db.session.query(Post)\
-                                    .join(User, Post.owner == User.id)\
-                                    .filter(User.id == profile_user_id)\
-                                    .order_by(Post.created_at.desc())\
-                                    .limit(50)\
-                                    .all()
-                posts_to_dict = [post.to_dict() for post in posts]
-                return posts_to_dict
+                query = query.filter(Post.owner == profile_user_id)
 
-            else:
-                posts = self.db.session.query(Post)\
-                                    .order_by(Post.created_at.desc())\
-                                    .limit(50)\
-                                    .all()
-                
-                posts_to_dict = [post.to_dict() for post in posts]
-                return posts_to_dict
+            posts, next_cursor, prev_cursor = self._paginate_posts(query, before, after, limit)
+
+            return {
+                'posts': self.serialize_posts(posts, current_user_id),
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
+            }
+
+        except ValueError as e:
+            raise PostServiceError(str(e))
 
         except Exception as e:
             print("message:", e)
             raise PostServiceError(e)
-    
+
+    def _keyset_window(self, query, before=None, after=None, limit=50, keyset=None):
+        """Fetch up to limit + 1 posts past the cursor, in scan order.
+
+        `keyset` defaults to (Post.created_at, Post.id); timeline reads pass the
+        denormalized TimelineEntry columns so the scan stays on their index.
+        Scan order is newest first, or oldest first when paging with `after`.
+        """
+        created_col, id_col = keyset or (Post.created_at, Post.id)
+        position = tuple_(created_col, id_col)
+
+        if after:
+            return query.filter(position > decode_cursor(after))\
+                        .order_by(created_col.asc(), id_col.asc())\
+                        .limit(limit + 1)\
+                        .all()
+
+        if before:
+            query = query.filter(position < decode_cursor(before))
+        return query.order_by(created_col.desc(), id_col.desc())\
+                    .limit(limit + 1)\
+                    .all()
+
+    def _page_from_window(self, window, after=None, limit=50):
+        """Turn a scan-order window into a newest-first page and its cursors"""
+        posts = window[:limit]
+        if after:
+            posts.reverse()
+            # The `after` anchor itself is older, so there is always an older page
+            has_older = bool(posts)
+        else:
+            has_older = len(window) > limit
+
+        next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id) if has_older else None
+        prev_cursor = encode_cursor(posts[0].created_at, posts[0].id) if posts else None
+
+        return posts, next_cursor, prev_cursor
+
+    def _paginate_posts(self, query, before=None, after=None, limit=50, keyset=None):
+        """Apply a (created_at, id) keyset window to a Post query"""
+        window = self._keyset_window(query, before, after, limit, keyset)
+        return self._page_from_window(window, after, limit)
+
+    def query_timeline(self, user_id, before=None, after=None, limit=50):
+        """Return one page of the user's home timeline, newest first.
+
+        Pushed posts come from the materialized timeline. Posts by friends in
+        pull mode (see TimelineService) are read from the author's
+        (owner, created_at, id) index with the same window and merged in.
+        """
+        try:
+            from ..services import timeline_service
+
+            timeline_query = self.db.session.query(Post)\
+                                   .join(TimelineEntry, TimelineEntry.post_id == Post.id)\
+                                   .options(joinedload(Post.owner_user))\
+                                   .filter(TimelineEntry.user_id == user_id)
+            window = self._keyset_window(
+                timeline_query, before, after, limit,
+                keyset=(TimelineEntry.created_at, TimelineEntry.post_id)
+            )
+
+            pull_author_ids = timeline_service.get_pull_author_ids(user_id)
+            if pull_author_ids:
+                pull_query = self.db.session.query(Post)\
+                                   .options(joinedload(Post.owner_user))\
+                                   .filter(Post.owner.in_(pull_author_ids))
+                pulled = self._keyset_window(pull_query, before, after, limit)
+
+                merged = {post.id: post for post in window + pulled}.values()
+                window = sorted(
+                    merged,
+                    key=lambda post: (post.created_at, post.id),
+                    reverse=not after
+                )[:limit + 1]
+
+            posts, next_cursor, prev_cursor = self._page_from_window(window, after, limit)
+
+            return {
+                'posts': self.serialize_posts(posts, user_id),
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
+            }
+
+        except ValueError as e:
+            raise PostServiceError(str(e))
+
+        except Exception as e:
+            current_app.logger.error(f'Timeline query failed for user {user_id}: {e}')
+            raise PostServiceError(e)
+
+    def serialize_posts(self, posts, current_user_id=None):
+        """Serialize a page of posts with a fixed number of queries.
+
+        Owners are expected to be eager loaded by the caller and counts come
+        from the post row. The current user's likes and the most recent
+        LIKE_SAMPLE_SIZE likers of every post are fetched for the whole page
+        in one query each, so the payload stays small however popular a
+        post gets.
+        """
+        if not posts:
+            return []
+
+        post_ids = [post.id for post in posts]
+
+        liked_post_ids = set()
+        if current_user_id:
+            liked_post_ids = set(self.db.session.execute(
+                select(PostLike.post_id).where(
+                    PostLike.user_id == current_user_id,
+                    PostLike.post_id.in_(post_ids)
+                )
+            ).scalars())
+
+            # Toggles still waiting in the like buffer
+            from ..services import like_buffer
+            if like_buffer.enabled:
+                for post_id, liked in like_buffer.pending_intents(current_user_id, post_ids).items():
+                    if liked:
+                        liked_post_ids.add(post_id)
+                    else:
+                        liked_post_ids.discard(post_id)
+
+        # The newest few likes of each post, one (post_id, id) index range
+        # scan per post however many likes it has
+        sample_size = current_app.config['LIKE_SAMPLE_SIZE']
+        samples = union_all(*[
+            select(PostLike.id, PostLike.post_id, PostLike.user_id)
+            .where(PostLike.post_id == post_id)
+            .order_by(PostLike.id.desc())
+            .limit(sample_size)
+            .subquery()
+            .select()
+            for post_id in post_ids
+        ]).subquery()
+
+        likers_by_post = {post_id: [] for post_id in post_ids}
+        liker_rows = self.db.session.query(samples.c.post_id, samples.c.user_id, User.username)\
+                                    .join(User, samples.c.user_id == User.id)\
+                                    .order_by(samples.c.post_id, samples.c.id.desc())\
+                                    .all()
+        for post_id, user_id, username in liker_rows:
+            likers_by_post[post_id].append({
+                "user_id": user_id,
+                "username": username
+            })
+
+        return [
+            post.to_dict(
+                recent_likers=likers_by_post[post.id],
+                liked_by_me=post.id in liked_post_ids
+            )
+            for post in posts
+        ]
+
+    def query_post_likers(self, post_id, before=None, limit=50):
+        """Return one page of a post's likers, most recent first.
+
+        Keyset paginated on PostLike.id; `before` is the like id returned as
+        next_cursor by the previous page.
+        """
+        try:
+            query = self.db.session.query(PostLike.id, User.id, User.username, User.display_name, User.avatar_path)\
+                                   .join(User, PostLike.user_id == User.id)\
+                                   .filter(PostLike.post_id == post_id)
+            if before:
+                query = query.filter(PostLike.id < int(before))
+
+            rows = query.order_by(PostLike.id.desc()).limit(limit + 1).all()
+
+            likers = [
+                {
+                    'user_id': user_id,
+                    'username': username,
+                    'display_name': display_name,
+                    'avatar_path': avatar_path
+                }
+                for _, user_id, username, display_name, avatar_path in rows[:limit]
+            ]
+            next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+
+            return {'likers': likers, 'next_cursor': next_cursor}
+
+        except ValueError:
+            raise PostServiceError(f"Invalid cursor: {before}")
+
+        except Exception as e:
+            raise PostServiceError(str(e))
+
     def create_post(self, user_id, file, description=None):
             image_path = None
+            image_info = {}
 
             # Only process image if file is provided
             if file:
-                upload_folder = os.path.join('app', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-
-                file_extension = file.filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-                file_path = os.path.join(upload_folder, unique_filename)
-
-                file.save(file_path)
-                image_path = f"uploads/{unique_filename}"
+                from ..services import image_service, upload_service
+                try:
+                    image_path = upload_service.store(file)
+                except UploadServiceError as e:
+                    raise PostServiceError(str(e))
+                image_info = upload_service.image_info(image_path)
+                image_info['image_variants'] = image_service.existing_variants(image_path)
 
             new_post = Post(
                 owner=user_id,
                 image_path=image_path,
-                description=description
+                description=description,
+                **image_info
             )
 
             self.db.session.add(new_post)
+            self.db.session.flush()
+
+            from ..services import timeline_service
+            from .timeline_service import TimelineServiceError
+            try:
+                with self.db.session.begin_nested():
+                    timeline_service.fan_out_post(new_post)
+            except TimelineServiceError as e:
+                # Publish anyway; friends merge the post in at read time
+                current_app.logger.error(f'Timeline fan-out failed for post {new_post.id}: {e}')
+                timeline_service.fall_back_to_pull(new_post)
+
             self.db.session.commit()
 
-            return new_post
+            if image_path:
+                image_service.process_post_image(new_post.id, image_path)
 
-    def create_like(self, user_id, post_id):
-        try:
-            new_like = PostLike(
-                user_id = user_id,
-                post_id = post_id
-            )
-            self.db.session.add(new_like)
-            self.db.session.commit()
+            return new_post
 
-        except Exception as e:
-            self.db.rollback()
-            raise PostServiceError(e)
+    def _bump_counter(self, post_id, column, delta):
+        """Atomically add delta to one of the post's counter columns.
+        Returns the number of posts updated (0 if the post does not exist)."""
+        # Counter changes are not edits, so keep updated_at as it is
+        return self.db.session.execute(
+            update(Post).where(Post.id == post_id).values({
+                column: column + delta,
+                Post.updated_at: Post.updated_at
+            })
+        ).rowcount
+
+    def get_like_count(self, post_id):
+        """Get the denormalized like count for a post"""
+        return self.db.session.execute(
+            select(Post.like_count).where(Post.id == post_id)
+        ).scalar() or 0
 
     def delete_post(self, user_id, post_id):
         post = Post.query.filter_by(id=post_id, owner=user_id).first()
@@ -84,12 +295,13 @@ class PostService:
             raise PostServiceError("Post not found or not authorized")
 
         try:
-            # Only delete image file if post has an image
-            if post.image_path:
-                image_path = os.path.join('app', 'static', post.image_path)
-                if os.path.exists(image_path):
-                    os.remove(image_path)
+            from ..services import upload_service
 
+            # The image file is removed by the upload sweeper once nothing
+            # references it any more
+            upload_service.release(post.image_path)
+
+            TimelineEntry.query.filter_by(post_id=post.id).delete(synchronize_session=False)
             self.db.session.delete(post)
             self.db.session.commit()
             return True
@@ -98,18 +310,48 @@ class PostService:
             self.db.session.rollback()
             raise Exception(e)
 
-    def query_post_likes(self, post_id):
-        return Post.query.get(post_id).likes
+    def toggle_like(self, user_id, post_id):
+        """Like the post, or unlike it if the user already liked it.
 
-    def remove_like(self, like_id):
+        Relies on the unique (post_id, user_id) index instead of loading the
+        likers: a DELETE that hits a row means the post was liked, otherwise
+        the like is inserted once the counter update has found the post. A
+        concurrent duplicate insert fails on the index and is treated as
+        already liked. Returns (liked, like_count).
+        """
         try:
-            like = PostLike.query.filter_by(id=like_id).first()
-            self.db.session.delete(like)
+            removed = self.db.session.execute(
+                delete(PostLike).where(
+                    PostLike.post_id == post_id,
+                    PostLike.user_id == user_id
+                )
+            ).rowcount
+
+            if removed:
+                liked = False
+                self._bump_counter(post_id, Post.like_count, -removed)
+            else:
+                liked = True
+                # Counting first also checks the post exists, so the insert
+                # below can only fail on the unique (post_id, user_id) index
+                if not self._bump_counter(post_id, Post.like_count, 1):
+                    raise PostServiceError("Post not found")
+                try:
+                    with self.db.session.begin_nested():
+                        self.db.session.add(PostLike(user_id=user_id, post_id=post_id))
+                except IntegrityError:
+                    # Lost a race against a double click: already liked
+                    self._bump_counter(post_id, Post.like_count, -1)
+
             self.db.session.commit()
+            return liked, self.get_like_count(post_id)
 
+        except PostServiceError:
+            self.db.session.rollback()
+            raise
         except Exception as e:
-            self.db.rollback()
-            raise PostServiceError(e)
+            self.db.session.rollback()
+            raise PostServiceError(str(e))
 
     # Comment methods
     def create_comment(self, user_id, post_id, content, parent_id=None):
@@ -124,19 +366,30 @@ class PostService:
                 raise PostServiceError("Post not found")
 
             # If parent_id provided, verify parent comment exists and belongs to same post
+            parent_comment = None
             if parent_id:
                 parent_comment = PostComment.query.get(parent_id)
                 if not parent_comment or parent_comment.post_id != post_id:
                     raise PostServiceError("Invalid parent comment")
+                if len(parent_comment.path) // PostComment.SEGMENT_LENGTH >= PostComment.MAX_DEPTH:
+                    raise PostServiceError("Replies cannot be nested any deeper")
 
+            # The path ends with the comment's own id, appended once it has one
+            parent_path = parent_comment.path if parent_comment else ''
             new_comment = PostComment(
                 user_id=user_id,
                 post_id=post_id,
                 content=content.strip(),
-                parent_id=parent_id
+                parent_id=parent_id,
+                path=parent_path
             )
 
             self.db.session.add(new_comment)
+            self.db.session.flush()
+
+            new_comment.path = parent_path + PostComment.path_segment(new_comment.id)
+
+            self._bump_counter(post_id, Post.comment_count, 1)
             self.db.session.commit()
 
             # Reload the comment with user relationship eagerly loaded
@@ -153,25 +406,130 @@ class PostService:
             self.db.session.rollback()
             raise PostServiceError(str(e))
 
-    def get_post_comments(self, post_id):
-        """Get all top-level comments for a post with their replies"""
+    def get_comment_subtree(self, comment_id):
+        """Get one comment with all of its nested replies, serialized.
+        Loaded as a single range scan over the materialized path."""
+        comment = PostComment.query.get(comment_id)
+        if not comment:
+            raise PostServiceError("Comment not found")
+
         try:
-            # Get only top-level comments (parent_id is None)
-            comments = PostComment.query.filter_by(
-                post_id=post_id,
-                parent_id=None
-            ).order_by(PostComment.id.asc()).all()
+            comments = PostComment.query.options(joinedload(PostComment.user))\
+                                        .filter(comment.subtree_filter())\
+                                        .order_by(PostComment.path.asc())\
+                                        .all()
 
-            return comments
+            return self.build_comment_tree(comments, root_parent_id=comment.parent_id)[0]
 
         except Exception as e:
             raise PostServiceError(str(e))
 
+    def count_comment_subtree(self, comment):
+        """Count a comment and all of its nested replies"""
+        return self.db.session.execute(
+            select(func.count(PostComment.id)).where(comment.subtree_filter())
+        ).scalar()
+
+    def build_comment_tree(self, comments, root_parent_id=None):
+        """Nest serialized comments under their parents.
+
+        Expects parents to come before their replies, e.g. ordered by id or
+        by path.
+        Returns the comments whose parent is root_parent_id (top-level
+        comments by default); other replies whose parent is not in the list
+        are dropped.
+        """
+        nodes = {}
+        roots = []
+        for comment in comments:
+            node = comment.to_dict(replies=[])
+            nodes[comment.id] = node
+
+            if comment.parent_id == root_parent_id:
+                roots.append(node)
+            elif comment.parent_id in nodes:
+                parent = nodes[comment.parent_id]
+                parent['replies'].append(node)
+                parent['reply_count'] += 1
+
+        return roots
+
+    def query_comment_page(self, post_id, parent_id=None, after=None, limit=20):
+        """Return one page of a post's comments under parent_id, oldest first.
+
+        parent_id None pages the top-level comments. Each comment carries its
+        total direct reply_count and only its first COMMENT_REPLY_PREVIEW
+        replies; the rest are fetched by paging with that comment as the
+        parent. Keyset paginated on the comment id.
+        """
+        try:
+            query = PostComment.query.options(joinedload(PostComment.user))\
+                                     .filter(PostComment.post_id == post_id,
+                                             PostComment.parent_id == parent_id)
+            if after:
+                query = query.filter(PostComment.id > int(after))
+
+            page = query.order_by(PostComment.id.asc()).limit(limit + 1).all()
+            next_cursor = page[limit - 1].id if len(page) > limit else None
+            page = page[:limit]
+            if not page:
+                return {'comments': [], 'next_cursor': None}
+
+            # First few direct replies of every comment on the page
+            ranked_replies = select(
+                PostComment.id,
+                func.row_number().over(
+                    partition_by=PostComment.parent_id,
+                    order_by=PostComment.id.asc()
+                ).label('rank')
+            ).where(PostComment.parent_id.in_([c.id for c in page])).subquery()
+
+            previews = PostComment.query.options(joinedload(PostComment.user))\
+                                        .join(ranked_replies, ranked_replies.c.id == PostComment.id)\
+                                        .filter(ranked_replies.c.rank <= current_app.config['COMMENT_REPLY_PREVIEW'])\
+                                        .order_by(PostComment.id.asc())\
+                                        .all()
+
+            loaded = sorted(page + previews, key=lambda comment: comment.id)
+            reply_counts = dict(
+                self.db.session.query(PostComment.parent_id, func.count(PostComment.id))
+                               .filter(PostComment.parent_id.in_([c.id for c in loaded]))
+                               .group_by(PostComment.parent_id)
+                               .all()
+            )
+
+            comments = self.build_comment_tree(loaded, root_parent_id=parent_id)
+            for comment in comments:
+                comment['reply_count'] = reply_counts.get(comment['id'], 0)
+                for reply in comment['replies']:
+                    reply['reply_count'] = reply_counts.get(reply['id'], 0)
+
+            return {'comments': comments, 'next_cursor': next_cursor}
+
+        except ValueError:
+            raise PostServiceError(f"Invalid cursor: {after}")
+
+        except Exception as e:
+            raise PostServiceError(str(e))
+
+    def query_comment_replies(self, comment_id, after=None, limit=20):
+        """Return one page of a comment's direct replies, with the number of
+        replies nested under the comment at any depth"""
+        comment = PostComment.query.get(comment_id)
+        if not comment:
+            raise PostServiceError("Comment not found")
+
+        page = self.query_comment_page(comment.post_id, comment.id, after, limit)
+        page['post_id'] = comment.post_id
+        page['total_reply_count'] = self.count_comment_subtree(comment) - 1
+        return page
+
     def get_comment_count(self, post_id):
         """Get total count of comments (including replies) for a post"""
         try:
-            count = PostComment.query.filter_by(post_id=post_id).count()
-            return count
+            return self.db.session.execute(
+                select(Post.comment_count).where(Post.id == post_id)
+            ).scalar() or 0
         except Exception as e:
             raise PostServiceError(str(e))
 
@@ -182,9 +540,17 @@ class PostService:
             if not comment:
                 raise PostServiceError("Comment not found or not authorized")
 
-            # Cascade delete will handle replies due to model definition
-            self.db.session.delete(comment)
+            # Delete the comment and all of its nested replies as one range
+            # delete over the materialized path. Counted first: where the
+            # parent_id cascade runs per row, rowcount misses cascaded replies
+            removed = self.count_comment_subtree(comment)
+            self.db.session.execute(
+                delete(PostComment).where(comment.subtree_filter()),
+                execution_options={'synchronize_session': False}
+            )
+            self._bump_counter(comment.post_id, Post.comment_count, -removed)
             self.db.session.commit()
+            self.db.session.expire_all()
             return True
 
         except PostServiceError:
@@ -194,35 +560,40 @@ class PostService:
             self.db.session.rollback()
             raise PostServiceError(str(e))
 
+    def recount_post_counters(self, post_ids=None):
+        """Recompute like_count and comment_count from the source tables.
 
+        Repairs drift in the denormalized counters, for example after rows
+        were removed by a database-level cascade. Pass post_ids to limit the
+        update to those posts; otherwise every post is recomputed.
+        """
+        try:
+            statement = update(Post).values(
+                like_count=select(func.count(PostLike.id))
+                    .where(PostLike.post_id == Post.id)
+                    .scalar_subquery(),
+                comment_count=select(func.count(PostComment.id))
+                    .where(PostComment.post_id == Post.id)
+                    .scalar_subquery(),
+                updated_at=Post.updated_at
+            )
+            if post_ids is not None:
+                statement = statement.where(Post.id.in_(post_ids))
 
+            result = self.db.session.execute(statement, execution_options={'synchronize_session': False})
+            self.db.session.commit()
+            return result.rowcount
 
+        except Exception as e:
+            self.db.session.rollback()
+            raise PostServiceError(str(e))
 
     def validate_image(self, file):
+        # Type, size and content are checked in the same pass that saves the
+        # upload, see UploadService.store()
         if file.filename == '':
              raise PostServiceError('No file selected')
 
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        if not file.filename.lower().endswith(tuple(allowed_extensions)):
-             raise PostServiceError('Invalid file type. Only images allowed.')
-
-        try:
-            # Validate image by opening it
-            img = Image.open(file.stream)
-            img.verify()
-            file.stream.seek(0)  # Reset stream after verification
-
-            # Check image size (max 10MB)
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-
-            if file_size > 10 * 1024 * 1024:  # 10MB limit
-                raise PostServiceError('File too large. Maximum size is 10MB.')
-            
-            return file
-        
-        except Exception as e:
-            raise PostServiceError(str(e))
+        return file
 
 
@@ -0,0 +1,166 @@
+from flask import current_app
+from sqlalchemy import case, func, insert, select, literal, and_, or_, true
+from ..models import User, Post, Friendship, TimelineEntry
+
+class TimelineServiceError(Exception): pass
+
+class TimelineService:
+    """Maintains the materialized per-user home timelines (fan-out on write)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _friend_ids_select(self, user_id, *columns):
+        """Select the ids of the user's accepted friends, plus any extra columns"""
+        return select(
+            case(
+                (Friendship.requester_id == user_id, Friendship.requested_id),
+                else_=Friendship.requester_id
+            ),
+            *columns
+        ).where(
+            Friendship.status == 'accepted',
+            or_(Friendship.requester_id == user_id, Friendship.requested_id == user_id)
+        )
+
+    def count_friends(self, user_id):
+        """Count the user's accepted friends"""
+        return self.db.session.execute(
+            select(func.count()).select_from(Friendship).where(
+                Friendship.status == 'accepted',
+                or_(Friendship.requester_id == user_id, Friendship.requested_id == user_id)
+            )
+        ).scalar()
+
+    def get_pull_author_ids(self, user_id):
+        """Ids of the user's friends whose posts are merged in at read time"""
+        friend_ids = self._friend_ids_select(user_id).subquery()
+        return self.db.session.execute(
+            select(User.id).where(
+                User.id.in_(select(friend_ids.c[0])),
+                User.timeline_pull.is_(True)
+            )
+        ).scalars().all()
+
+    def fan_out_post(self, post):
+        """Push a new post into the owner's and every friend's timeline.
+
+        Runs as one INSERT ... SELECT over the friendship table inside the
+        caller's transaction; the caller commits. Owners in pull mode (see
+        update_mode) only get the post in their own timeline and friends merge
+        it in at read time.
+        """
+        try:
+            self.db.session.add(TimelineEntry(
+                user_id=post.owner,
+                post_id=post.id,
+                created_at=post.created_at
+            ))
+
+            if self.db.session.get(User, post.owner).timeline_pull:
+                return
+
+            self.db.session.execute(
+                insert(TimelineEntry).from_select(
+                    ['user_id', 'post_id', 'created_at'],
+                    self._friend_ids_select(
+                        post.owner,
+                        literal(post.id),
+                        literal(post.created_at, TimelineEntry.created_at.type)
+                    )
+                )
+            )
+
+        except Exception as e:
+            raise TimelineServiceError(e)
+
+    def update_mode(self, user_id):
+        """Re-check the user's fan-out mode after their friendships changed.
+
+        Users with more than TIMELINE_FANOUT_FRIEND_LIMIT friends switch to
+        pull mode. When they drop back under it, their recent posts are pushed
+        into their friends' timelines before pull mode is cleared, so nothing
+        friends were merging in at read time disappears.
+        """
+        user = self.db.session.get(User, user_id)
+        over_limit = self.count_friends(user_id) > current_app.config['TIMELINE_FANOUT_FRIEND_LIMIT']
+
+        if over_limit and not user.timeline_pull:
+            user.timeline_pull = True
+        elif not over_limit and user.timeline_pull:
+            friend_ids = self._friend_ids_select(user_id).subquery()
+            recent_posts = select(Post.id, Post.created_at)\
+                .where(Post.owner == user_id)\
+                .order_by(Post.created_at.desc(), Post.id.desc())\
+                .limit(current_app.config['TIMELINE_BACKFILL_SIZE'])\
+                .subquery()
+
+            self.db.session.execute(
+                insert(TimelineEntry).from_select(
+                    ['user_id', 'post_id', 'created_at'],
+                    select(friend_ids.c[0], recent_posts.c.id, recent_posts.c.created_at)
+                    .select_from(friend_ids.join(recent_posts, true()))
+                    .where(~select(TimelineEntry.id).where(and_(
+                        TimelineEntry.user_id == friend_ids.c[0],
+                        TimelineEntry.post_id == recent_posts.c.id
+                    )).exists())
+                )
+            )
+            user.timeline_pull = False
+
+    def fall_back_to_pull(self, post):
+        """Publish a post whose fan-out failed: it goes into the owner's own
+        timeline and the owner is switched to pull mode, so friends still see
+        it at read time"""
+        self.db.session.add(TimelineEntry(
+            user_id=post.owner,
+            post_id=post.id,
+            created_at=post.created_at
+        ))
+        self.db.session.get(User, post.owner).timeline_pull = True
+
+    def _backfill(self, user_id, author_id):
+        """Copy the author's most recent posts into the user's timeline"""
+        recent_posts = select(Post.id, Post.created_at)\
+            .where(Post.owner == author_id)\
+            .where(~select(TimelineEntry.id).where(and_(
+                TimelineEntry.user_id == user_id,
+                TimelineEntry.post_id == Post.id
+            )).exists())\
+            .order_by(Post.created_at.desc(), Post.id.desc())\
+            .limit(current_app.config['TIMELINE_BACKFILL_SIZE'])\
+            .subquery()
+
+        self.db.session.execute(
+            insert(TimelineEntry).from_select(
+                ['user_id', 'post_id', 'created_at'],
+                select(literal(user_id), recent_posts.c.id, recent_posts.c.created_at)
+            )
+        )
+
+    def on_friendship_added(self, user1_id, user2_id):
+        """Backfill both timelines with the new friend's recent posts"""
+        try:
+            self._backfill(user1_id, user2_id)
+            self._backfill(user2_id, user1_id)
+            self.update_mode(user1_id)
+            self.update_mode(user2_id)
+
+        except Exception as e:
+            raise TimelineServiceError(e)
+
+    def on_friendship_removed(self, user1_id, user2_id):
+        """Drop each user's posts from the other's timeline. Called once the
+        friendship row is deleted (and flushed)."""
+        try:
+            for user_id, author_id in ((user1_id, user2_id), (user2_id, user1_id)):
+                author_posts = select(Post.id).where(Post.owner == author_id)
+                TimelineEntry.query.filter(
+                    TimelineEntry.user_id == user_id,
+                    TimelineEntry.post_id.in_(author_posts)
+                ).delete(synchronize_session=False)
+            self.update_mode(user1_id)
+            self.update_mode(user2_id)
+
+        except Exception as e:
+            raise TimelineServiceError(e)
@@ -0,0 +1,350 @@
+from flask import current_app
+from PIL import Image
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: chunk writes are only serialized within one process
+    fcntl = None
+from ..models import UploadBlob, UploadSession
+from .image_service import STATIC_ROOT, displayed_size
+
+UPLOAD_FOLDER = 'uploads'
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each accepted format -> (Pillow format, file extension).
+# WebP is a RIFF container and is checked separately.
+SIGNATURES = {
+    b'\xff\xd8\xff': ('JPEG', 'jpg'),
+    b'\x89PNG\r\n\x1a\n': ('PNG', 'png'),
+    b'GIF87a': ('GIF', 'gif'),
+    b'GIF89a': ('GIF', 'gif')
+}
+
+class UploadServiceError(Exception): pass
+
+class UploadOffsetError(UploadServiceError):
+    """A chunk did not start where the upload left off"""
+    def __init__(self, offset):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+def sniff_format(header):
+    """(Pillow format, extension) for the first bytes of a file, or None"""
+    for signature, image_format in SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return ('WEBP', 'webp')
+    return None
+
+def shard_path(sha256, extension):
+    """Static-relative path of a blob: uploads/ab/cd/<sha256>.<ext>.
+    Two levels of two hex characters keep every directory small."""
+    return f"{UPLOAD_FOLDER}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+
+def file_sha256(file_path):
+    """SHA-256 of a file on disk, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class UploadService:
+    """Content-addressed upload storage with reference counting.
+
+    Files are named after the SHA-256 of their bytes, so the same image
+    posted, sent in chat or used as an avatar many times is stored once.
+    Every row that points at a blob holds one reference; the file is only
+    removed when the last reference is released. All upload call sites go
+    through store(), which places files in the sharded layout of shard_path().
+    Blobs left without references are deleted by UploadSweeper.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        # One lock per upload session being written in this process, dropped
+        # when unused; other processes are kept out with flock()
+        self._session_locks = weakref.WeakValueDictionary()
+        self._session_locks_lock = threading.Lock()
+
+    def store(self, file, max_size=None, reference=True):
+        """Validate an uploaded image and save it, taking a reference to it.
+
+        The upload is streamed once into a temp file while it is hashed and
+        its bytes counted, aborting as soon as it passes max_size (default
+        MAX_CONTENT_LENGTH). The format is sniffed from the leading bytes,
+        not the filename, and only the image header is decoded before the
+        file is renamed into place.
+
+        With reference=False the blob is stored without a reference, for
+        chat images that are only referenced once sent, see acquire().
+
+        Joins the caller's transaction; the caller commits. Returns the
+        static-relative path to put in image_path/avatar_path/image_url.
+        """
+        if max_size is None:
+            max_size = current_app.config['MAX_CONTENT_LENGTH']
+
+        upload_folder = os.path.join(STATIC_ROOT, UPLOAD_FOLDER)
+        os.makedirs(upload_folder, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        image_format = None
+        tmp_path = os.path.join(upload_folder, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as out:
+                for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                    if image_format is None:
+                        image_format = sniff_format(chunk)
+                        if image_format is None:
+                            raise UploadServiceError('Invalid file type. Only images allowed.')
+
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadServiceError(f'File too large. Maximum size is {max_size // (1024 * 1024)}MB.')
+
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            if image_format is None:
+                raise UploadServiceError('No file selected')
+            dimensions = self._check_header(tmp_path, image_format[0])
+
+            sha256 = digest.hexdigest()
+            extension = image_format[1]
+            path = self._acquire(sha256, shard_path(sha256, extension), dimensions, int(reference))
+
+            target = os.path.join(STATIC_ROOT, path)
+            if os.path.exists(target):
+                # Reused bytes: restart the sweeper's grace period, the file
+                # may have been unreferenced until now
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+
+            return path
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _check_header(self, file_path, image_format):
+        """Decode only the image header and make sure it matches the sniffed
+        format; Pillow also rejects decompression bombs here. Returns the
+        displayed (width, height)."""
+        try:
+            with Image.open(file_path) as img:
+                if img.format != image_format or not img.width or not img.height:
+                    raise UploadServiceError('Invalid image file')
+                return displayed_size(img)
+        except UploadServiceError:
+            raise
+        except Exception as e:
+            raise UploadServiceError(f'Invalid image file: {str(e)}')
+
+    def _acquire(self, sha256, path, dimensions, references):
+        """Add references to the blob for sha256, creating it at path with
+        (width, height) dimensions if new. The placeholder is added by the
+        image worker pool. Returns the blob's path."""
+        if self._increment(sha256, references):
+            return self._blob_path(sha256)
+
+        width, height = dimensions
+        try:
+            with self.db.session.begin_nested():
+                self.db.session.add(UploadBlob(
+                    sha256=sha256,
+                    path=path,
+                    ref_count=references,
+                    width=width,
+                    height=height
+                ))
+            return path
+        except IntegrityError:
+            # Someone stored the same bytes in the meantime
+            if not self._increment(sha256, references):
+                raise UploadServiceError("Failed to store upload")
+            return self._blob_path(sha256)
+
+    def _increment(self, sha256, references=1):
+        return self.db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.sha256 == sha256)
+            .values(ref_count=UploadBlob.ref_count + references)
+        ).rowcount
+
+    def acquire(self, path):
+        """Take a reference to an upload stored earlier, in the caller's
+        transaction. Fails if the sweeper has deleted it since."""
+        acquired = self.db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == path)
+            .values(ref_count=UploadBlob.ref_count + 1)
+        ).rowcount
+        if not acquired:
+            raise UploadServiceError('Image is no longer available, upload it again')
+
+    def _blob_path(self, sha256):
+        return self.db.session.execute(
+            select(UploadBlob.path).where(UploadBlob.sha256 == sha256)
+        ).scalar()
+
+    def image_info(self, path):
+        """{'image_width', 'image_height', 'image_placeholder'} of a stored
+        upload, to copy onto the post or message that shows it. Values are
+        None for uploads saved before placeholders existed, and the
+        placeholder until the image worker pool has made it."""
+        blob = self.db.session.execute(
+            select(UploadBlob.width, UploadBlob.height, UploadBlob.placeholder)
+            .where(UploadBlob.path == path)
+        ).first()
+
+        width, height, placeholder = blob if blob else (None, None, None)
+        return {
+            'image_width': width,
+            'image_height': height,
+            'image_placeholder': placeholder
+        }
+
+    def release(self, path):
+        """Drop one reference to path in the caller's transaction.
+
+        The blob row, the file and its variants are left for UploadSweeper,
+        which deletes them together once the count is zero, so deletes do no
+        file I/O and a concurrent store() of the same bytes can still take
+        the blob back. Uploads saved before blobs existed have no row.
+        """
+        if not path:
+            return
+
+        self.db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == path)
+            .values(ref_count=UploadBlob.ref_count - 1)
+        )
+
+    def _session_file(self, upload_id):
+        return os.path.join(current_app.config['UPLOAD_SESSION_FOLDER'], upload_id)
+
+    def _get_session(self, user_id, upload_id):
+        upload = UploadSession.query.filter_by(id=upload_id, user_id=user_id).first()
+        if not upload:
+            raise UploadServiceError("Upload not found")
+        return upload
+
+    def _session_lock(self, upload_id):
+        with self._session_locks_lock:
+            lock = self._session_locks.get(upload_id)
+            if lock is None:
+                lock = self._session_locks[upload_id] = threading.Lock()
+            return lock
+
+    def _received(self, upload):
+        """Bytes of upload on disk so far"""
+        try:
+            return os.path.getsize(self._session_file(upload.id))
+        except FileNotFoundError:
+            # Expired by the sweeper while its row was being read
+            raise UploadServiceError("Upload not found")
+
+    def _session_data(self, upload):
+        file_path = self._session_file(upload.id)
+        return {
+            'upload_id': upload.id,
+            'size': upload.size,
+            'offset': os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        }
+
+    def create_session(self, user_id, filename, size):
+        """Start a resumable upload of size bytes"""
+        if not filename:
+            raise UploadServiceError('No file selected')
+        max_size = current_app.config['MAX_CONTENT_LENGTH']
+        if size <= 0 or size > max_size:
+            raise UploadServiceError(f'File too large. Maximum size is {max_size // (1024 * 1024)}MB.')
+
+        upload = UploadSession(id=uuid.uuid4().hex, user_id=user_id, filename=filename, size=size)
+        os.makedirs(current_app.config['UPLOAD_SESSION_FOLDER'], exist_ok=True)
+        open(self._session_file(upload.id), 'wb').close()
+
+        self.db.session.add(upload)
+        self.db.session.commit()
+        return self._session_data(upload)
+
+    def get_session(self, user_id, upload_id):
+        """Offset to resume from after a disconnect"""
+        return self._session_data(self._get_session(user_id, upload_id))
+
+    def write_chunk(self, user_id, upload_id, offset, stream):
+        """Write the bytes of stream at offset, straight to disk.
+
+        offset must equal the bytes received so far; a chunk cut off by a
+        disconnect keeps what arrived and the client resumes from there.
+        Chunks of one session are written one at a time, across threads and
+        worker processes, so a retried chunk racing the original cannot pass
+        the offset check twice.
+        Returns the session data with the new offset.
+        """
+        upload = self._get_session(user_id, upload_id)
+
+        with self._session_lock(upload.id):
+            try:
+                out = open(self._session_file(upload.id), 'r+b')
+            except FileNotFoundError:
+                raise UploadServiceError("Upload not found")
+
+            with out:
+                if fcntl:
+                    # Held until the file is closed
+                    fcntl.flock(out, fcntl.LOCK_EX)
+
+                received = os.fstat(out.fileno()).st_size
+                if offset != received:
+                    raise UploadOffsetError(received)
+
+                out.seek(offset)
+                try:
+                    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                        if received + len(chunk) > upload.size:
+                            raise UploadServiceError('Chunk goes past the declared upload size')
+                        out.write(chunk)
+                        received += len(chunk)
+                finally:
+                    out.truncate()
+
+        return self._session_data(upload)
+
+    def open_upload(self, user_id, upload_id):
+        """The completed upload as a FileStorage, for the same validate_image
+        and store() flow as a multipart upload"""
+        upload = self._get_session(user_id, upload_id)
+        if self._received(upload) != upload.size:
+            raise UploadServiceError('Upload is not complete')
+
+        try:
+            stream = open(self._session_file(upload.id), 'rb')
+        except FileNotFoundError:
+            raise UploadServiceError("Upload not found")
+        return FileStorage(stream=stream, filename=upload.filename)
+
+    def finish_upload(self, user_id, upload_id):
+        """Drop a session once its file has been stored, or to abort it"""
+        upload = self._get_session(user_id, upload_id)
+        file_path = self._session_file(upload.id)
+
+        self.db.session.delete(upload)
+        self.db.session.commit()
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+import os
+import time
+from ..models import Post, Message, User, UploadBlob, UploadSession
+from .upload_service import STATIC_ROOT, UPLOAD_FOLDER
+from .image_service import VARIANTS
+
+def _original_stem(stem):
+    """Stem of the upload a variant belongs to, or None for an original"""
+    base, _, name = stem.rpartition('_')
+    return base if base and name in VARIANTS else None
+
+class UploadSweeper:
+    """Deletes upload files nothing references any more.
+
+    Request handlers only drop references; every UPLOAD_GC_INTERVAL_SECONDS
+    the sweeper walks the upload folder in batches. A file is garbage when
+    its blob's ref_count is zero, or, for files saved before blobs existed,
+    when no post.image_path, message.image_url or user.avatar_path points at
+    it. Zero-count blobs are checked against those columns too as a
+    backstop, so a miscounted reference is logged instead of deleting an
+    image in use. Garbage older than the grace period (which also covers
+    chat images uploaded but not sent yet) is removed with its variants and
+    blob row. Abandoned resumable upload sessions are expired too.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.app = None
+        self.last_metrics = None
+
+    def start(self, app):
+        """Start the background sweep loop for this app"""
+        from .. import socketio
+
+        self.app = app
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        from .. import socketio
+
+        while True:
+            socketio.sleep(self.app.config['UPLOAD_GC_INTERVAL_SECONDS'])
+            try:
+                with self.app.app_context():
+                    self.sweep(dry_run=self.app.config['UPLOAD_GC_DRY_RUN'])
+            except Exception as e:
+                self.app.logger.error(f'Upload sweep failed: {e}')
+
+    def sweep(self, dry_run=False, grace_seconds=None, batch_size=None):
+        """Run one full pass over the upload folder and return its metrics.
+        With dry_run, orphans are counted but nothing is deleted."""
+        from flask import current_app
+
+        config = current_app.config
+        if grace_seconds is None:
+            grace_seconds = config['UPLOAD_GC_GRACE_SECONDS']
+        if batch_size is None:
+            batch_size = config['UPLOAD_GC_BATCH_SIZE']
+
+        metrics = {
+            'scanned': 0,
+            'orphaned': 0,
+            'deleted': 0,
+            'bytes_freed': 0,
+            'errors': 0,
+            'expired_sessions': 0,
+            'dry_run': dry_run
+        }
+        started = time.monotonic()
+        cutoff = time.time() - grace_seconds
+
+        batch = []
+        for candidate in self._candidates(cutoff, metrics):
+            batch.append(candidate)
+            if len(batch) >= batch_size:
+                self._sweep_batch(batch, cutoff, dry_run, metrics)
+                batch = []
+        if batch:
+            self._sweep_batch(batch, cutoff, dry_run, metrics)
+
+        self._expire_sessions(config, dry_run, metrics)
+
+        metrics['seconds'] = round(time.monotonic() - started, 3)
+        self.last_metrics = metrics
+        current_app.logger.info(f'Upload sweep: {metrics}')
+        return metrics
+
+    def _candidates(self, cutoff, metrics):
+        """Yield (kind, static-relative path, file path) for every file older
+        than cutoff that may be an orphan. kind is 'original' when it needs a
+        database check and 'orphan' when it is garbage on its own: a leftover
+        temp file or a variant whose original is gone."""
+        upload_root = os.path.join(STATIC_ROOT, UPLOAD_FOLDER)
+
+        for directory, _, filenames in os.walk(upload_root):
+            stems = {filename.rsplit('.', 1)[0] for filename in filenames}
+
+            for filename in filenames:
+                file_path = os.path.join(directory, filename)
+                metrics['scanned'] += 1
+                try:
+                    if os.path.getmtime(file_path) > cutoff:
+                        continue
+                except OSError:
+                    continue
+
+                path = os.path.relpath(file_path, STATIC_ROOT).replace(os.sep, '/')
+                stem = filename.rsplit('.', 1)[0]
+                original_stem = _original_stem(stem)
+
+                if filename.endswith('.tmp'):
+                    yield 'orphan', path, file_path
+                elif original_stem is not None:
+                    if original_stem not in stems:
+                        yield 'orphan', path, file_path
+                else:
+                    yield 'original', path, file_path
+
+    def _referenced(self, paths):
+        referenced = set()
+        for column in (Post.image_path, Message.image_url, User.avatar_path):
+            referenced.update(self.db.session.execute(
+                select(column).where(column.in_(paths))
+            ).scalars())
+        return referenced
+
+    def _sweep_batch(self, batch, cutoff, dry_run, metrics):
+        from flask import current_app
+        from . import image_service
+
+        originals = [path for kind, path, _ in batch if kind == 'original']
+        ref_counts = dict(self.db.session.execute(
+            select(UploadBlob.path, UploadBlob.ref_count).where(UploadBlob.path.in_(originals))
+        ).all()) if originals else {}
+
+        unreferenced = {path for path in originals if ref_counts.get(path, 0) <= 0}
+        referenced = self._referenced(unreferenced) if unreferenced else set()
+        for path in referenced & ref_counts.keys():
+            current_app.logger.warning(f'Upload {path} has no references counted but is still in use')
+
+        orphans = [
+            (kind, path, file_path) for kind, path, file_path in batch
+            if kind == 'orphan' or (path in unreferenced and path not in referenced)
+        ]
+
+        metrics['orphaned'] += len(orphans)
+        if dry_run or not orphans:
+            return
+
+        for kind, path, file_path in orphans:
+            try:
+                # Referenced again or reused by a new upload since it was scanned
+                if (kind == 'original' and not self._claim(path)) or os.path.getmtime(file_path) > cutoff:
+                    self.db.session.rollback()
+                    continue
+                size = os.path.getsize(file_path)
+                if kind == 'original':
+                    image_service.delete_image(path)
+                else:
+                    os.remove(file_path)
+                self.db.session.commit()
+                metrics['deleted'] += 1
+                metrics['bytes_freed'] += size
+            except OSError:
+                self.db.session.rollback()
+                metrics['errors'] += 1
+
+    def _claim(self, path):
+        """Delete the blob row of an orphaned original if it still has no
+        references. The transaction stays open while the file is unlinked, so
+        a concurrent store() of the same bytes waits on the row and then
+        creates a new blob instead of reusing the one being removed. False if
+        the blob has been referenced again."""
+        deleted = self.db.session.execute(
+            delete(UploadBlob).where(UploadBlob.path == path, UploadBlob.ref_count <= 0)
+        ).rowcount
+        return bool(deleted) or self.db.session.execute(
+            select(UploadBlob.id).where(UploadBlob.path == path)
+        ).first() is None
+
+    def _expire_sessions(self, config, dry_run, metrics):
+        """Drop upload sessions older than UPLOAD_SESSION_TTL_SECONDS and
+        chunk files left without a session"""
+        ttl = config['UPLOAD_SESSION_TTL_SECONDS']
+        folder = config['UPLOAD_SESSION_FOLDER']
+
+        expired = self.db.session.execute(
+            select(UploadSession.id).where(
+                UploadSession.created_at < datetime.utcnow() - timedelta(seconds=ttl)
+            )
+        ).scalars().all()
+        metrics['expired_sessions'] += len(expired)
+        if dry_run:
+            return
+
+        if expired:
+            self.db.session.execute(delete(UploadSession).where(UploadSession.id.in_(expired)))
+            self.db.session.commit()
+
+        if not os.path.isdir(folder):
+            return
+        cutoff = time.time() - ttl
+        for entry in os.scandir(folder):
+            try:
+                if entry.name in expired or (entry.stat().st_mtime < cutoff and
+                                             not self.db.session.get(UploadSession, entry.name)):
+                    os.remove(entry.path)
+            except OSError:
+                metrics['errors'] += 1
@@ -1,8 +1,8 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from PIL import Image
-import os
-import uuid
-from ..models import User
+from sqlalchemy import or_, select
+from ..models import Message, User
+
+AVATAR_MAX_SIZE = 5 * 1024 * 1024  # 5MB
 
 class UserSettingsServiceError(Exception): pass
 
@@ -90,30 +90,24 @@ class UserSettingsService:
             # Validate image
             validated_file = self._validate_image(file)
 
-            # Create avatars directory
-            upload_folder = os.path.join('app', 'static', 'uploads', 'avatars')
-            os.makedirs(upload_folder, exist_ok=True)
-
-            # Delete old avatar if exists
-            if user.avatar_path:
-                old_avatar_path = os.path.join('app', 'static', user.avatar_path)
-                if os.path.exists(old_avatar_path):
-                    try:
-                        os.remove(old_avatar_path)
-                    except Exception as e:
-                        print(f"Failed to delete old avatar: {e}")
-
-            # Save new avatar
-            file_extension = validated_file.filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-            file_path = os.path.join(upload_folder, unique_filename)
+            from ..services import image_service, upload_service
 
-            validated_file.save(file_path)
+            # Store the new avatar before releasing the old one, so
+            # re-uploading the same image keeps its blob alive. The old file
+            # is removed by the upload sweeper.
+            old_avatar_path = user.avatar_path
+            avatar_path = upload_service.store(validated_file, max_size=AVATAR_MAX_SIZE)
+            upload_service.release(old_avatar_path)
 
-            # Update user avatar path
-            user.avatar_path = f"uploads/avatars/{unique_filename}"
+            # Update user avatar path; resized variants are copied if these
+            # bytes were rendered before, otherwise recorded once the worker
+            # pool has rendered them
+            user.avatar_path = avatar_path
+            user.avatar_variants = image_service.existing_variants(avatar_path)
             self.db.session.commit()
 
+            image_service.process_avatar(user.id, user.avatar_path)
+
             return user.avatar_path
 
         except UserSettingsServiceError:
@@ -134,18 +128,32 @@ class UserSettingsService:
             if not check_password_hash(user.password_hash, password):
                 raise UserSettingsServiceError("Password is incorrect")
 
-            # Delete avatar if exists
-            if user.avatar_path:
-                avatar_path = os.path.join('app', 'static', user.avatar_path)
-                if os.path.exists(avatar_path):
-                    try:
-                        os.remove(avatar_path)
-                    except Exception as e:
-                        print(f"Failed to delete avatar: {e}")
+            from ..services import upload_service
+
+            # Release the avatar, post images and images in the user's chats,
+            # which go with the account; the upload sweeper removes the files
+            # once nothing references them
+            chat_images = self.db.session.execute(
+                select(Message.image_url).where(
+                    or_(Message.sender_id == user.id, Message.receiver_id == user.id),
+                    Message.image_url.isnot(None)
+                )
+            ).scalars().all()
+            for path in [user.avatar_path] + [post.image_path for post in user.posts] + chat_images:
+                upload_service.release(path)
+
+            # Posts whose like/comment counters lose rows in the cascade
+            touched_post_ids = {like.post_id for like in user.post_likes} | \
+                               {comment.post_id for comment in user.comments}
 
             # Delete user (cascade will handle relationships)
             self.db.session.delete(user)
             self.db.session.commit()
+
+            if touched_post_ids:
+                from ..services import post_service
+                post_service.recount_post_counters(touched_post_ids)
+
             return True
 
         except UserSettingsServiceError:
@@ -156,31 +164,9 @@ class UserSettingsService:
             raise UserSettingsServiceError(str(e))
 
     def _validate_image(self, file):
-        """Validate uploaded image file"""
+        """Validate uploaded image file. Type, size and content are checked
+        while it is stored, see UploadService.store()"""
         if file.filename == '':
             raise UserSettingsServiceError('No file selected')
 
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        if not file.filename.lower().endswith(tuple(allowed_extensions)):
-            raise UserSettingsServiceError('Invalid file type. Only images allowed.')
-
-        try:
-            # Validate image by opening it
-            img = Image.open(file.stream)
-            img.verify()
-            file.stream.seek(0)  # Reset stream after verification
-
-            # Check image size (max 5MB for avatars)
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-
-            if file_size > 5 * 1024 * 1024:  # 5MB limit
-                raise UserSettingsServiceError('File too large. Maximum size is 5MB.')
-
-            return file
-
-        except UserSettingsServiceError:
-            raise
-        except Exception as e:
-            raise UserSettingsServiceError(f'Invalid image file: {str(e)}')
+        return file
@@ -1,8 +1,8 @@
 from .. import socketio, db
 from flask_socketio import join_room, leave_room, emit
 from flask import session
-from ..models import User, Message
-from ..services import friendship_service
+from ..models import User
+from ..services import friendship_service, chat_service
 from datetime import datetime
 
 @socketio.on('connect')
@@ -61,21 +61,14 @@ def mark_messages_read(data):
     if not friend_id:
         return
 
-    # Mark all messages from friend as read
-    messages = Message.query.filter(
-        Message.sender_id == friend_id,
-        Message.receiver_id == current_user_id,
-        Message.is_read == False
-    ).all()
-
-    message_ids = []
-    for message in messages:
-        message.is_read = True
-        message_ids.append(message.id)
+    messenger = chat_service.find_messenger(current_user_id, friend_id)
+    if not messenger:
+        return
 
+    # Mark all messages from friend as read
+    last_read_id = chat_service.mark_read(messenger, current_user_id)
     db.session.commit()
 
     # Notify sender that messages were read
-    if message_ids:
-        print(f"Emitting messages_read to user_{friend_id}: {message_ids}")
-        emit('messages_read', {'message_ids': message_ids, 'friend_id': current_user_id}, room=f'user_{friend_id}')
+    if last_read_id:
+        emit('messages_read', {'last_read_id': last_read_id, 'friend_id': current_user_id}, room=f'user_{friend_id}')
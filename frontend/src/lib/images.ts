@@ -0,0 +1,39 @@
+// Resized variants written for every upload (see ImageService.VARIANTS):
+// variant name -> longest edge in pixels
+const VARIANT_SIZES: Record<string, number> = {
+	thumb: 320,
+	feed: 1080,
+	full: 2048
+};
+
+export const MEDIA_URL = 'http://localhost:5000/media/';
+
+export type ImageVariants = Record<string, string> | null | undefined;
+
+/**
+ * srcset for an upload's resized variants, or undefined while they are not
+ * rendered yet (the original is used then). Widths are derived from the
+ * original's size when it is known; variants are never upscaled, so small
+ * images collapse onto one entry.
+ */
+export function variantSrcset(variants: ImageVariants, width?: number, height?: number): string | undefined {
+	if (!variants) return undefined;
+
+	const longest = width && height ? Math.max(width, height) : undefined;
+	const candidates = new Map<number, string>();
+	for (const [name, path] of Object.entries(variants)) {
+		const size = VARIANT_SIZES[name];
+		if (!size) continue;
+
+		const scale = longest ? Math.min(1, size / longest) : 1;
+		const variantWidth = width ? Math.round(width * scale) : size;
+		if (!candidates.has(variantWidth)) {
+			candidates.set(variantWidth, `${MEDIA_URL}${path} ${variantWidth}w`);
+		}
+	}
+
+	return [...candidates.entries()]
+		.sort(([a], [b]) => a - b)
+		.map(([, candidate]) => candidate)
+		.join(', ') || undefined;
+}
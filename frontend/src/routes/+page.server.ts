@@ -10,7 +10,7 @@ export const load: PageServerLoad = async ({fetch}) => {
         redirect(303, '/signin');
     }
 
-    const postsResponse = await fetch('http://localhost:5000/api/posts');
+    const postsResponse = await fetch('http://localhost:5000/api/timeline');
     const postsData = await postsResponse.json();
 
     // Fetch friends list
@@ -0,0 +1,152 @@
+"""
+Move existing uploads into the sharded layout (uploads/ab/cd/<sha256>.<ext>)
+and rewrite post.image_path, message.image_url and user.avatar_path to match.
+
+Runs offline in chunks and can be re-run after an interruption: each file is
+linked into its new place, the rows are committed, and only then are the old
+files removed. Files with identical bytes collapse into one blob.
+
+    python migrate_upload_layout.py [--batch-size 500] [--dry-run]
+"""
+import argparse
+import os
+import shutil
+from sqlalchemy import func, select, union, update
+from app import app_init, db
+
+# Paths already in the sharded layout
+SHARDED_PATTERN = 'uploads/__/__/%'
+
+def legacy_paths(after, limit):
+    """Next chunk of distinct unsharded paths referenced by any row"""
+    from app.models import Post, Message, User
+
+    paths = union(
+        select(Post.image_path.label('path')),
+        select(Message.image_url),
+        select(User.avatar_path)
+    ).subquery()
+
+    return db.session.execute(
+        select(paths.c.path)
+        .where(paths.c.path.isnot(None),
+               paths.c.path.notlike(SHARDED_PATTERN),
+               paths.c.path > after)
+        .order_by(paths.c.path)
+        .limit(limit)
+    ).scalars().all()
+
+def place(source, target):
+    """Make target a copy of source without removing source; an existing
+    target already holds the same bytes and is kept"""
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+    # Unreferenced until the chunk commits; keep the upload sweeper off it
+    os.utime(target)
+
+def reference_count(path):
+    from app.models import Post, Message, User
+
+    return sum(
+        db.session.execute(select(func.count()).where(column == path)).scalar()
+        for column in (Post.image_path, Message.image_url, User.avatar_path)
+    )
+
+def migrate_path(path):
+    """Link one upload and its variants into the sharded layout and point
+    every row at it. Returns the new path, or None if the file is missing."""
+    from app.models import Post, Message, User, UploadBlob
+    from app.services.upload_service import STATIC_ROOT, shard_path, file_sha256
+    from app.services.image_service import VARIANTS, VARIANT_FILE_EXTENSIONS, variant_path
+    from app.services import image_service
+
+    source = os.path.join(STATIC_ROOT, path)
+    if not os.path.exists(source):
+        return None
+
+    sha256 = file_sha256(source)
+    blob = UploadBlob.query.filter_by(sha256=sha256).first()
+    # Identical bytes share one file, named after whichever copy came first
+    extension = (blob.path if blob else path).rsplit('.', 1)[1].lower()
+    new_path = shard_path(sha256, extension)
+
+    place(source, os.path.join(STATIC_ROOT, new_path))
+    for name in VARIANTS:
+        for variant_extension in VARIANT_FILE_EXTENSIONS:
+            old_variant = os.path.join(STATIC_ROOT, variant_path(path, name, variant_extension))
+            if os.path.exists(old_variant):
+                place(old_variant, os.path.join(STATIC_ROOT, variant_path(new_path, name, variant_extension)))
+
+    # Uploads named by their hash were stored through a blob row and their
+    # rows are already counted; older uuid-named ones add a reference per row
+    if blob is None:
+        db.session.add(UploadBlob(sha256=sha256, path=new_path, ref_count=reference_count(path)))
+    else:
+        if os.path.basename(path).rsplit('.', 1)[0] != sha256:
+            blob.ref_count += reference_count(path)
+        blob.path = new_path
+
+    variants = image_service.existing_variants(new_path)
+    db.session.execute(
+        update(Post).where(Post.image_path == path)
+        .values(image_path=new_path, image_variants=variants, updated_at=Post.updated_at)
+    )
+    db.session.execute(
+        update(Message).where(Message.image_url == path)
+        .values(image_url=new_path, image_variants=variants)
+    )
+    db.session.execute(
+        update(User).where(User.avatar_path == path)
+        .values(avatar_path=new_path, avatar_variants=variants)
+    )
+    return new_path
+
+def migrate(batch_size, dry_run):
+    app = app_init()
+
+    with app.app_context():
+        from app.services import image_service
+
+        moved = missing = 0
+        after = ''
+
+        while True:
+            paths = legacy_paths(after, batch_size)
+            if not paths:
+                break
+            after = paths[-1]
+
+            if dry_run:
+                print(f"Would move {len(paths)} files (up to {after})")
+                moved += len(paths)
+                continue
+
+            done = []
+            for path in paths:
+                if migrate_path(path):
+                    done.append(path)
+                else:
+                    missing += 1
+                    print(f"Missing file, rows left unchanged: {path}")
+            db.session.commit()
+
+            # Rows now point at the new files; drop the old copies
+            for path in done:
+                image_service.delete_image(path)
+
+            moved += len(done)
+            print(f"Moved {moved} files so far")
+
+        print(f"Done: {moved} moved, {missing} missing" + (" (dry run)" if dry_run else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    migrate(args.batch_size, args.dry_run)
@@ -0,0 +1,39 @@
+"""Add unique (post_id, user_id) constraint to PostLike
+
+Revision ID: 0a7c3e5f9d21
+Revises: f2b6d8e4a157
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7c3e5f9d21'
+down_revision = 'f2b6d8e4a157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicate likes left behind by racing double clicks, keeping the
+    # oldest row, then bring the counters back in line
+    op.execute("""
+        DELETE FROM post_like
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM post_like GROUP BY post_id, user_id
+        )
+    """)
+    op.execute("""
+        UPDATE post SET
+            like_count = (SELECT COUNT(*) FROM post_like WHERE post_like.post_id = post.id)
+    """)
+
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_post_like_post_user', ['post_id', 'user_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_post_like_post_user', type_='unique')
@@ -0,0 +1,28 @@
+"""Add pagination indexes to PostComment
+
+Revision ID: 1b8d4f6a0e32
+Revises: 0a7c3e5f9d21
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8d4f6a0e32'
+down_revision = '0a7c3e5f9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.create_index('ix_post_comment_post_parent_id', ['post_id', 'parent_id', 'id'], unique=False)
+        batch_op.create_index('ix_post_comment_parent_id_id', ['parent_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_comment_parent_id_id')
+        batch_op.drop_index('ix_post_comment_post_parent_id')
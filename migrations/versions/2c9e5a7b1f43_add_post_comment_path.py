@@ -0,0 +1,69 @@
+"""Add materialized path to PostComment
+
+Revision ID: 2c9e5a7b1f43
+Revises: 1b8d4f6a0e32
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9e5a7b1f43'
+down_revision = '1b8d4f6a0e32'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('path', sa.String(length=1024), nullable=True))
+        batch_op.create_index('ix_post_comment_post_path', ['post_id', 'path'], unique=False)
+
+    # Backfill paths. Parents always have a lower id than their replies, so
+    # walking in id order sees every parent before its children.
+    connection = op.get_bind()
+    comment_table = sa.table('post_comment',
+        sa.column('id', sa.Integer),
+        sa.column('parent_id', sa.Integer),
+        sa.column('path', sa.String)
+    )
+
+    statement = comment_table.update()\
+        .where(comment_table.c.id == sa.bindparam('comment_id'))\
+        .values(path=sa.bindparam('new_path'))
+
+    # One batch of comments in memory at a time; parents from earlier
+    # batches are read back with their paths already set
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(comment_table.c.id, comment_table.c.parent_id)
+            .where(comment_table.c.id > last_id)
+            .order_by(comment_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        parent_ids = {parent_id for _, parent_id in rows if parent_id is not None}
+        paths = dict(connection.execute(
+            sa.select(comment_table.c.id, comment_table.c.path)
+            .where(comment_table.c.id.in_(parent_ids))
+        ).all()) if parent_ids else {}
+
+        updates = []
+        for comment_id, parent_id in rows:
+            paths[comment_id] = (paths.get(parent_id) or '') + f"{comment_id:010d}/"
+            updates.append({'comment_id': comment_id, 'new_path': paths[comment_id]})
+        connection.execute(statement, updates)
+
+
+def downgrade():
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_comment_post_path')
+        batch_op.drop_column('path')
@@ -0,0 +1,38 @@
+"""Add resized image variant columns
+
+Revision ID: 5d3a8c1e7b92
+Revises: 2c9e5a7b1f43
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d3a8c1e7b92'
+down_revision = '2c9e5a7b1f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_variants', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('avatar_variants')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
@@ -0,0 +1,35 @@
+"""Add content-addressed upload blobs
+
+Revision ID: 8b4e2f6c1d05
+Revises: 5d3a8c1e7b92
+Create Date: 2026-10-18 17:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e2f6c1d05'
+down_revision = '5d3a8c1e7b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing uuid-named uploads are left without a blob row; releasing
+    # them deletes the file as before
+    op.create_table('upload_blob',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('path'),
+        sa.UniqueConstraint('sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_blob')
@@ -0,0 +1,42 @@
+"""Add image dimensions and placeholders
+
+Revision ID: a6f1c9d3e280
+Revises: 8b4e2f6c1d05
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6f1c9d3e280'
+down_revision = '8b4e2f6c1d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_blob', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('placeholder', sa.Text(), nullable=True))
+
+    for table in ('post', 'message'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_width', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('image_height', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('image_placeholder', sa.Text(), nullable=True))
+
+
+def downgrade():
+    for table in ('message', 'post'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('image_placeholder')
+            batch_op.drop_column('image_height')
+            batch_op.drop_column('image_width')
+
+    with op.batch_alter_table('upload_blob', schema=None) as batch_op:
+        batch_op.drop_column('placeholder')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
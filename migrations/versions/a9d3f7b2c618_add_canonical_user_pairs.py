@@ -0,0 +1,168 @@
+"""Add canonical (low_user_id, high_user_id) pairs to Messenger and Friendship
+
+Revision ID: a9d3f7b2c618
+Revises: f1c6a8e2b574
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f7b2c618'
+down_revision = 'f1c6a8e2b574'
+branch_labels = None
+depends_on = None
+
+PREVIEW_LENGTH = 255
+
+messenger = sa.table('messenger',
+    sa.column('id', sa.Integer),
+    sa.column('first_user_id', sa.Integer),
+    sa.column('second_user_id', sa.Integer),
+    sa.column('low_user_id', sa.Integer),
+    sa.column('high_user_id', sa.Integer),
+    sa.column('last_message_id', sa.Integer),
+    sa.column('last_message_preview', sa.String),
+    sa.column('last_message_at', sa.DateTime),
+    sa.column('first_user_unread', sa.Integer),
+    sa.column('second_user_unread', sa.Integer),
+    sa.column('first_user_last_read_message_id', sa.Integer),
+    sa.column('second_user_last_read_message_id', sa.Integer)
+)
+friendship = sa.table('friendship',
+    sa.column('id', sa.Integer),
+    sa.column('requester_id', sa.Integer),
+    sa.column('requested_id', sa.Integer),
+    sa.column('low_user_id', sa.Integer),
+    sa.column('high_user_id', sa.Integer),
+    sa.column('status', sa.String)
+)
+message = sa.table('message',
+    sa.column('id', sa.Integer),
+    sa.column('messenger_id', sa.Integer),
+    sa.column('receiver_id', sa.Integer),
+    sa.column('content', sa.Text),
+    sa.column('image_url', sa.String),
+    sa.column('created_at', sa.DateTime)
+)
+
+
+def fill_pair(connection, table, first, second):
+    connection.execute(table.update().values(
+        low_user_id=sa.case((first <= second, first), else_=second),
+        high_user_id=sa.case((first <= second, second), else_=first)
+    ))
+
+
+def duplicate_pairs(connection, table):
+    return connection.execute(
+        sa.select(table.c.low_user_id, table.c.high_user_id)
+        .group_by(table.c.low_user_id, table.c.high_user_id)
+        .having(sa.func.count() > 1)
+    ).all()
+
+
+def merge_messengers(connection):
+    """Fold duplicate conversations of a pair into the oldest one, keeping
+    every message and the furthest read cursor of each participant"""
+    for low_user_id, high_user_id in duplicate_pairs(connection, messenger):
+        rows = connection.execute(
+            sa.select(messenger)
+            .where(messenger.c.low_user_id == low_user_id, messenger.c.high_user_id == high_user_id)
+            .order_by(messenger.c.id)
+        ).all()
+        keep, duplicate_ids = rows[0], [row.id for row in rows[1:]]
+
+        cursors = {}
+        for row in rows:
+            for user_id, cursor in ((row.first_user_id, row.first_user_last_read_message_id),
+                                    (row.second_user_id, row.second_user_last_read_message_id)):
+                if cursor is not None:
+                    cursors[user_id] = max(cursors.get(user_id, cursor), cursor)
+
+        connection.execute(
+            message.update().where(message.c.messenger_id.in_(duplicate_ids)).values(messenger_id=keep.id)
+        )
+        connection.execute(messenger.delete().where(messenger.c.id.in_(duplicate_ids)))
+
+        def unread(user_id):
+            query = sa.select(sa.func.count()).where(
+                message.c.messenger_id == keep.id,
+                message.c.receiver_id == user_id
+            )
+            if cursors.get(user_id) is not None:
+                query = query.where(message.c.id > cursors[user_id])
+            return connection.execute(query).scalar()
+
+        last = connection.execute(
+            sa.select(message.c.id, message.c.content, message.c.image_url, message.c.created_at)
+            .where(message.c.messenger_id == keep.id)
+            .order_by(message.c.created_at.desc(), message.c.id.desc())
+            .limit(1)
+        ).first()
+        if last is None:
+            preview = None
+        elif last.image_url and not last.content:
+            preview = "📷 Image"
+        elif last.image_url:
+            preview = f"📷 {last.content}"[:PREVIEW_LENGTH]
+        else:
+            preview = (last.content or '')[:PREVIEW_LENGTH]
+
+        connection.execute(messenger.update().where(messenger.c.id == keep.id).values(
+            last_message_id=last.id if last else None,
+            last_message_preview=preview,
+            last_message_at=last.created_at if last else None,
+            first_user_unread=unread(keep.first_user_id),
+            second_user_unread=unread(keep.second_user_id),
+            first_user_last_read_message_id=cursors.get(keep.first_user_id),
+            second_user_last_read_message_id=cursors.get(keep.second_user_id)
+        ))
+
+
+def merge_friendships(connection):
+    """Keep one friendship per pair, preferring an accepted one"""
+    for low_user_id, high_user_id in duplicate_pairs(connection, friendship):
+        ids = connection.execute(
+            sa.select(friendship.c.id)
+            .where(friendship.c.low_user_id == low_user_id, friendship.c.high_user_id == high_user_id)
+            .order_by(sa.case((friendship.c.status == 'accepted', 0), else_=1), friendship.c.id)
+        ).scalars().all()
+        connection.execute(friendship.delete().where(friendship.c.id.in_(ids[1:])))
+
+
+def upgrade():
+    for table in ('messenger', 'friendship'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('low_user_id', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('high_user_id', sa.Integer(), nullable=True))
+
+    connection = op.get_bind()
+    fill_pair(connection, messenger, messenger.c.first_user_id, messenger.c.second_user_id)
+    fill_pair(connection, friendship, friendship.c.requester_id, friendship.c.requested_id)
+    merge_messengers(connection)
+    merge_friendships(connection)
+
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.alter_column('low_user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('high_user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_unique_constraint('uq_messenger_user_pair', ['low_user_id', 'high_user_id'])
+
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.alter_column('low_user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('high_user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_unique_constraint('uq_friendship_user_pair', ['low_user_id', 'high_user_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_friendship_user_pair', type_='unique')
+        batch_op.drop_column('high_user_id')
+        batch_op.drop_column('low_user_id')
+
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_messenger_user_pair', type_='unique')
+        batch_op.drop_column('high_user_id')
+        batch_op.drop_column('low_user_id')
@@ -0,0 +1,26 @@
+"""Add (post_id, id) index to PostLike
+
+Revision ID: b2e8c4f1a937
+Revises: a9d3f7b2c618
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8c4f1a937'
+down_revision = 'a9d3f7b2c618'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.create_index('ix_post_like_post_id_id', ['post_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post_like', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_like_post_id_id')
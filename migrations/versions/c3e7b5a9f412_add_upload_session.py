@@ -0,0 +1,37 @@
+"""Add resumable upload sessions
+
+Revision ID: c3e7b5a9f412
+Revises: a6f1c9d3e280
+Create Date: 2026-10-18 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e7b5a9f412'
+down_revision = 'a6f1c9d3e280'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_session',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_session_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_session_created_at'))
+
+    op.drop_table('upload_session')
@@ -0,0 +1,63 @@
+"""Make PostComment.path non-null
+
+Revision ID: c5f0a2d8e146
+Revises: b2e8c4f1a937
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f0a2d8e146'
+down_revision = 'b2e8c4f1a937'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    # Fill any path still missing, parents first as in the original backfill
+    connection = op.get_bind()
+    comment_table = sa.table('post_comment',
+        sa.column('id', sa.Integer),
+        sa.column('parent_id', sa.Integer),
+        sa.column('path', sa.String)
+    )
+    statement = comment_table.update()\
+        .where(comment_table.c.id == sa.bindparam('comment_id'))\
+        .values(path=sa.bindparam('new_path'))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(comment_table.c.id, comment_table.c.parent_id)
+            .where(comment_table.c.id > last_id, comment_table.c.path.is_(None))
+            .order_by(comment_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        parent_ids = {parent_id for _, parent_id in rows if parent_id is not None}
+        paths = dict(connection.execute(
+            sa.select(comment_table.c.id, comment_table.c.path)
+            .where(comment_table.c.id.in_(parent_ids))
+        ).all()) if parent_ids else {}
+
+        updates = []
+        for comment_id, parent_id in rows:
+            paths[comment_id] = (paths.get(parent_id) or '') + f"{comment_id:010d}/"
+            updates.append({'comment_id': comment_id, 'new_path': paths[comment_id]})
+        connection.execute(statement, updates)
+
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.alter_column('path', existing_type=sa.String(length=1024), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post_comment', schema=None) as batch_op:
+        batch_op.alter_column('path', existing_type=sa.String(length=1024), nullable=True)
@@ -0,0 +1,28 @@
+"""Add (created_at, id) keyset indexes to Post
+
+Revision ID: c7d2e91f4a10
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e91f4a10'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_post_owner_created_at_id', ['owner', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_owner_created_at_id')
+        batch_op.drop_index('ix_post_created_at_id')
@@ -0,0 +1,54 @@
+"""Add timeline_entry table for fan-out-on-write home timelines
+
+Revision ID: d41f8a2b9c63
+Revises: c7d2e91f4a10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f8a2b9c63'
+down_revision = 'c7d2e91f4a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'post_id', name='uq_timeline_entry_user_post')
+    )
+    with op.batch_alter_table('timeline_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_entry_user_created_at_post', ['user_id', 'created_at', 'post_id'], unique=False)
+
+    # Backfill: every post goes into its owner's timeline and the timelines
+    # of the owner's accepted friends
+    op.execute("""
+        INSERT INTO timeline_entry (user_id, post_id, created_at)
+        SELECT owner, id, created_at FROM post
+    """)
+    op.execute("""
+        INSERT INTO timeline_entry (user_id, post_id, created_at)
+        SELECT CASE WHEN f.requester_id = p.owner THEN f.requested_id ELSE f.requester_id END,
+               p.id, p.created_at
+        FROM post p
+        JOIN friendship f
+          ON f.status = 'accepted'
+         AND (f.requester_id = p.owner OR f.requested_id = p.owner)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('timeline_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_entry_user_created_at_post')
+
+    op.drop_table('timeline_entry')
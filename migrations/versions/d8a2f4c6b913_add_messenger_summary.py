@@ -0,0 +1,103 @@
+"""Add conversation summary to Messenger
+
+Revision ID: d8a2f4c6b913
+Revises: c3e7b5a9f412
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2f4c6b913'
+down_revision = 'c3e7b5a9f412'
+branch_labels = None
+depends_on = None
+
+PREVIEW_LENGTH = 255
+
+
+def upgrade():
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('first_user_unread', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('second_user_unread', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_messenger_last_message_at'), ['last_message_at'], unique=False)
+
+    # Backfill from the messages: the latest message of each conversation and
+    # each participant's unread messages
+    connection = op.get_bind()
+    messenger = sa.table('messenger',
+        sa.column('id', sa.Integer),
+        sa.column('first_user_id', sa.Integer),
+        sa.column('second_user_id', sa.Integer),
+        sa.column('last_message_id', sa.Integer),
+        sa.column('last_message_preview', sa.String),
+        sa.column('last_message_at', sa.DateTime),
+        sa.column('first_user_unread', sa.Integer),
+        sa.column('second_user_unread', sa.Integer)
+    )
+    message = sa.table('message',
+        sa.column('id', sa.Integer),
+        sa.column('messenger_id', sa.Integer),
+        sa.column('receiver_id', sa.Integer),
+        sa.column('content', sa.Text),
+        sa.column('image_url', sa.String),
+        sa.column('is_read', sa.Boolean),
+        sa.column('created_at', sa.DateTime)
+    )
+
+    def unread_for(user_column):
+        return sa.select(sa.func.count()).where(
+            message.c.messenger_id == messenger.c.id,
+            message.c.receiver_id == user_column,
+            sa.or_(message.c.is_read.is_(None), message.c.is_read == sa.false())
+        ).scalar_subquery()
+
+    connection.execute(messenger.update().values(
+        first_user_unread=unread_for(messenger.c.first_user_id),
+        second_user_unread=unread_for(messenger.c.second_user_id)
+    ))
+
+    latest = connection.execute(
+        sa.select(message.c.messenger_id, message.c.id, message.c.content,
+                  message.c.image_url, message.c.created_at)
+        .order_by(message.c.messenger_id, message.c.created_at, message.c.id)
+    )
+    summaries = {}
+    for messenger_id, message_id, content, image_url, created_at in latest:
+        if image_url and not content:
+            preview = "📷 Image"
+        elif image_url:
+            preview = f"📷 {content}"
+        else:
+            preview = content or ''
+        summaries[messenger_id] = {
+            'messenger_id': messenger_id,
+            'message_id': message_id,
+            'preview': preview[:PREVIEW_LENGTH],
+            'created_at': created_at
+        }
+
+    if summaries:
+        connection.execute(
+            messenger.update()
+            .where(messenger.c.id == sa.bindparam('messenger_id'))
+            .values(last_message_id=sa.bindparam('message_id'),
+                    last_message_preview=sa.bindparam('preview'),
+                    last_message_at=sa.bindparam('created_at')),
+            list(summaries.values())
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_messenger_last_message_at'))
+        batch_op.drop_column('second_user_unread')
+        batch_op.drop_column('first_user_unread')
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_preview')
+        batch_op.drop_column('last_message_id')
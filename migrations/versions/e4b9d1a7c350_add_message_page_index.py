@@ -0,0 +1,26 @@
+"""Add (messenger_id, created_at, id) keyset index to Message
+
+Revision ID: e4b9d1a7c350
+Revises: d8a2f4c6b913
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9d1a7c350'
+down_revision = 'd8a2f4c6b913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_messenger_created_at_id', ['messenger_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_messenger_created_at_id')
@@ -0,0 +1,28 @@
+"""Add timeline_pull flag to User for hybrid push/pull timelines
+
+Revision ID: e9a05c3d7b18
+Revises: d41f8a2b9c63
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9a05c3d7b18'
+down_revision = 'd41f8a2b9c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timeline_pull', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.create_index(batch_op.f('ix_user_timeline_pull'), ['timeline_pull'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_timeline_pull'))
+        batch_op.drop_column('timeline_pull')
@@ -0,0 +1,91 @@
+"""Replace Message.is_read with per-participant read cursors on Messenger
+
+Revision ID: f1c6a8e2b574
+Revises: e4b9d1a7c350
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a8e2b574'
+down_revision = 'e4b9d1a7c350'
+branch_labels = None
+depends_on = None
+
+messenger = sa.table('messenger',
+    sa.column('id', sa.Integer),
+    sa.column('first_user_id', sa.Integer),
+    sa.column('second_user_id', sa.Integer),
+    sa.column('first_user_unread', sa.Integer),
+    sa.column('second_user_unread', sa.Integer),
+    sa.column('first_user_last_read_message_id', sa.Integer),
+    sa.column('second_user_last_read_message_id', sa.Integer)
+)
+message = sa.table('message',
+    sa.column('id', sa.Integer),
+    sa.column('messenger_id', sa.Integer),
+    sa.column('receiver_id', sa.Integer),
+    sa.column('is_read', sa.Boolean)
+)
+
+
+def upgrade():
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('first_user_last_read_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('second_user_last_read_message_id', sa.Integer(), nullable=True))
+
+    # Messages are marked read a whole conversation at a time, so the newest
+    # read message each participant received is where their cursor stands
+    def last_read(user_column):
+        return sa.select(sa.func.max(message.c.id)).where(
+            message.c.messenger_id == messenger.c.id,
+            message.c.receiver_id == user_column,
+            message.c.is_read == sa.true()
+        ).scalar_subquery()
+
+    def unread_after(user_column, cursor_column):
+        return sa.select(sa.func.count()).where(
+            message.c.messenger_id == messenger.c.id,
+            message.c.receiver_id == user_column,
+            sa.or_(cursor_column.is_(None), message.c.id > cursor_column)
+        ).scalar_subquery()
+
+    connection = op.get_bind()
+    connection.execute(messenger.update().values(
+        first_user_last_read_message_id=last_read(messenger.c.first_user_id),
+        second_user_last_read_message_id=last_read(messenger.c.second_user_id)
+    ))
+    connection.execute(messenger.update().values(
+        first_user_unread=unread_after(messenger.c.first_user_id, messenger.c.first_user_last_read_message_id),
+        second_user_unread=unread_after(messenger.c.second_user_id, messenger.c.second_user_last_read_message_id)
+    ))
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_column('is_read')
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_read', sa.Boolean(), nullable=True))
+
+    def read_by(user_column, cursor_column):
+        return sa.select(messenger.c.id).where(
+            messenger.c.id == message.c.messenger_id,
+            user_column == message.c.receiver_id,
+            message.c.id <= cursor_column
+        ).exists()
+
+    connection = op.get_bind()
+    connection.execute(message.update().values(
+        is_read=sa.or_(
+            read_by(messenger.c.first_user_id, messenger.c.first_user_last_read_message_id),
+            read_by(messenger.c.second_user_id, messenger.c.second_user_last_read_message_id)
+        )
+    ))
+
+    with op.batch_alter_table('messenger', schema=None) as batch_op:
+        batch_op.drop_column('second_user_last_read_message_id')
+        batch_op.drop_column('first_user_last_read_message_id')
@@ -0,0 +1,34 @@
+"""Add denormalized like_count and comment_count to Post
+
+Revision ID: f2b6d8e4a157
+Revises: e9a05c3d7b18
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8e4a157'
+down_revision = 'e9a05c3d7b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        UPDATE post SET
+            like_count = (SELECT COUNT(*) FROM post_like WHERE post_like.post_id = post.id),
+            comment_count = (SELECT COUNT(*) FROM post_comment WHERE post_comment.post_id = post.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,19 @@
+"""
+Recompute the denormalized like_count and comment_count columns on post
+from the post_like and post_comment tables.
+Safe to run at any time; run it after bulk data fixes or manual deletes.
+"""
+from app import app_init
+
+def repair():
+    app = app_init()
+
+    with app.app_context():
+        from app.services import post_service
+
+        print("Recomputing post like/comment counters...")
+        updated = post_service.recount_post_counters()
+        print(f"Counters repaired for {updated} posts")
+
+if __name__ == "__main__":
+    repair()
@@ -0,0 +1,26 @@
+"""
+Delete upload files that no post, message or avatar references any more.
+The app runs the same sweep in the background (UPLOAD_GC_ENABLED); use this
+to run one pass by hand, e.g. with --dry-run to see what would be removed.
+"""
+import argparse
+from app import app_init
+
+def sweep(dry_run, grace_seconds):
+    app = app_init()
+
+    with app.app_context():
+        from app.services import upload_sweeper
+
+        print("Sweeping unreferenced uploads" + (" (dry run)..." if dry_run else "..."))
+        metrics = upload_sweeper.sweep(dry_run=dry_run, grace_seconds=grace_seconds)
+        print(f"Scanned {metrics['scanned']} files, {metrics['orphaned']} orphaned, "
+              f"{metrics['deleted']} deleted ({metrics['bytes_freed']} bytes), "
+              f"{metrics['errors']} errors in {metrics['seconds']}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--grace-seconds', type=int, default=None)
+    args = parser.parse_args()
+    sweep(args.dry_run, args.grace_seconds)
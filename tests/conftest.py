@@ -0,0 +1,91 @@
+import io
+import os
+import shutil
+import sys
+import pytest
+from PIL import Image
+from sqlalchemy import event
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import generate_password_hash
+from app import app_init, db, services
+from app.config import TestingConfig
+from app.models import User
+
+PASSWORD = 'password123'
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """A testing app on a throwaway SQLite file. Socket event handlers are
+    bound to the first app created, so one app is shared by every test."""
+    folder = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('FLASK_ENV', 'testing')
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{folder / 'test.db'}", raising=False)
+        monkeypatch.setattr(TestingConfig, 'UPLOAD_SESSION_FOLDER', str(folder / 'upload_sessions'), raising=False)
+        monkeypatch.setattr(TestingConfig, 'SESSION_COOKIE_SECURE', False, raising=False)
+        app = app_init()
+
+    # Variants are rendered in worker processes that outlive a test's
+    # tables; tests that need them call render_variants() themselves
+    services.image_service.app = None
+
+    # Enforce foreign keys like the production databases do
+    with app.app_context():
+        @event.listens_for(db.engine, 'connect')
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+    yield app
+
+@pytest.fixture(scope='session')
+def static_root(app, tmp_path_factory):
+    """A throwaway static folder in place of app/static"""
+    root = tmp_path_factory.mktemp('static')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # app.services rebinds the module names to its service singletons
+        for name in ('app.services.image_service', 'app.services.upload_service',
+                     'app.services.upload_sweeper', 'app.routes.media'):
+            monkeypatch.setattr(sys.modules[name], 'STATIC_ROOT', str(root))
+        yield str(root)
+
+@pytest.fixture(autouse=True)
+def database(app, static_root):
+    """Fresh tables, an empty upload folder and an app context for every test"""
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+    shutil.rmtree(os.path.join(static_root, 'uploads'), ignore_errors=True)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app):
+    """Create a user and return its id"""
+    def make_user(username):
+        user = User(username=username, password_hash=generate_password_hash(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    return make_user
+
+@pytest.fixture
+def login(client):
+    """Sign the test client in as username"""
+    def login(username):
+        response = client.post('/api/signin', data={'username': username, 'password': PASSWORD})
+        assert response.get_json()['success']
+    return login
+
+@pytest.fixture
+def make_image():
+    """A PNG upload of a solid color; the same color gives the same bytes"""
+    def make_image(color=(200, 10, 10), size=(40, 30)):
+        data = io.BytesIO()
+        Image.new('RGB', size, color).save(data, 'PNG')
+        data.seek(0)
+        return FileStorage(stream=data, filename='image.png', content_type='image/png')
+    return make_image
@@ -0,0 +1,168 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import update
+from app import db, services, socketio
+from app.models import Message, Messenger
+
+@pytest.fixture
+def users(make_user):
+    return make_user('alice'), make_user('bob')
+
+def send(client, friend_id, content):
+    response = client.post('/api/send_message', json={'friend_id': friend_id, 'content': content})
+    assert response.status_code == 200
+    return response.get_json()['message']['id']
+
+def get_page(client, friend_id, **args):
+    response = client.get(f'/api/messages/{friend_id}', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_message_pages_walk_back_without_gaps(client, login, users):
+    alice, bob = users
+    login('alice')
+    message_ids = [send(client, bob, f'message {i}') for i in range(7)]
+
+    # Messages sent within the same second page on their id
+    db.session.execute(update(Message).values(created_at=datetime(2026, 1, 1)))
+    db.session.commit()
+
+    seen = []
+    page = get_page(client, bob, limit=3)
+    while True:
+        # Each page is in reading order, oldest first
+        seen[:0] = [message['id'] for message in page['messages']]
+        if not page['next_cursor']:
+            break
+        page = get_page(client, bob, limit=3, before=page['next_cursor'])
+
+    assert seen == message_ids
+
+def test_invalid_message_cursor(client, login, users):
+    alice, bob = users
+    login('alice')
+    send(client, bob, 'hi')
+
+    response = client.get(f'/api/messages/{bob}', query_string={'before': 99999})
+    assert response.status_code == 400
+
+def read_state(user_id):
+    """(read cursor, unread count) of user_id in the only conversation"""
+    db.session.expire_all()
+    messenger = Messenger.query.one()
+    if messenger.first_user_id == user_id:
+        return messenger.first_user_last_read_message_id, messenger.first_user_unread
+    return messenger.second_user_last_read_message_id, messenger.second_user_unread
+
+def test_opening_conversation_moves_read_cursor(client, login, users):
+    alice, bob = users
+    login('alice')
+    message_ids = [send(client, bob, f'message {i}') for i in range(3)]
+    assert read_state(bob) == (None, 3)
+
+    login('bob')
+    get_page(client, alice)
+    assert read_state(bob) == (message_ids[-1], 0)
+    # Sending does not move the sender's own cursor
+    assert read_state(alice) == (None, 0)
+
+    login('alice')
+    assert all(message['is_read'] for message in get_page(client, bob)['messages'])
+
+def test_scrollback_leaves_read_cursor(client, login, users):
+    alice, bob = users
+    login('alice')
+    message_ids = [send(client, bob, f'message {i}') for i in range(4)]
+
+    login('bob')
+    page = get_page(client, alice, limit=2)
+    assert read_state(bob) == (message_ids[-1], 0)
+
+    login('alice')
+    newest = send(client, bob, 'one more')
+
+    login('bob')
+    get_page(client, alice, limit=2, before=page['next_cursor'])
+    assert read_state(bob) == (message_ids[-1], 1)
+
+    get_page(client, alice, limit=2)
+    assert read_state(bob) == (newest, 0)
+
+def test_mark_read_event(app, client, login, users):
+    alice, bob = users
+    login('alice')
+    last_id = [send(client, bob, f'message {i}') for i in range(2)][-1]
+
+    login('bob')
+    socket = socketio.test_client(app, flask_test_client=client)
+    socket.emit('mark_read', {'friend_id': alice})
+    assert read_state(bob) == (last_id, 0)
+    socket.disconnect()
+
+def test_mark_read_only_moves_forward(client, login, users):
+    alice, bob = users
+    login('alice')
+    last_id = send(client, bob, 'hi')
+
+    messenger = Messenger.query.one()
+    assert services.chat_service.mark_read(messenger, bob) == last_id
+    db.session.commit()
+    assert services.chat_service.mark_read(messenger, bob) is None
+    assert read_state(bob) == (last_id, 0)
+
+def befriend(requester_id, requested_id):
+    friendship = services.friendship_service.send_friend_request(requester_id, requested_id)
+    services.friendship_service.accept_friend_request(friendship.id, requested_id)
+
+def inbox(client):
+    return {friend['username']: friend for friend in client.get('/api/friend_list').get_json()}
+
+def test_inbox_summary_both_directions(client, login, make_user, users):
+    alice, bob = users
+    carol = make_user('carol')
+    befriend(alice, bob)
+    befriend(carol, alice)
+
+    login('alice')
+    send(client, bob, 'first')
+    send(client, bob, 'second')
+    login('bob')
+    last_id = send(client, alice, 'reply')
+
+    messenger = Messenger.query.one()
+    assert messenger.last_message_id == last_id
+    assert messenger.last_message_preview == 'reply'
+
+    # Bob's own messages are not unread for him
+    assert inbox(client)['alice']['unread_count'] == 2
+    assert inbox(client)['alice']['last_message'] == 'reply'
+
+    login('alice')
+    friends = inbox(client)
+    assert list(friends) == ['bob', 'carol']
+    assert friends['bob']['unread_count'] == 1
+    assert friends['bob']['messenger_id'] == messenger.id
+    assert friends['carol']['last_message'] == 'No messages yet'
+    assert friends['carol']['unread_count'] == 0
+
+def test_one_conversation_per_pair(client, login, users):
+    alice, bob = users
+    befriend(alice, bob)
+
+    messenger = services.chat_service.get_or_create_messenger(alice, bob)
+    db.session.commit()
+    assert services.chat_service.get_or_create_messenger(bob, alice).id == messenger.id
+
+    login('bob')
+    send(client, alice, 'hi')
+
+    # Unfriending and friending again reuses the conversation
+    services.friendship_service.remove_friend(bob, alice)
+    db.session.commit()
+    befriend(bob, alice)
+    login('alice')
+    send(client, bob, 'hi again')
+
+    assert Messenger.query.count() == 1
+    assert inbox(client)['bob']['messenger_id'] == messenger.id
+    assert [m['content'] for m in get_page(client, bob)['messages']] == ['hi', 'hi again']
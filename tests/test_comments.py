@@ -0,0 +1,87 @@
+import pytest
+from app import db, services
+from app.models import Post, PostComment
+from app.services.post_service import PostServiceError
+
+@pytest.fixture
+def post(make_user):
+    """(author id, post id)"""
+    alice = make_user('alice')
+    post = Post(owner=alice, description='hello')
+    db.session.add(post)
+    db.session.commit()
+    return alice, post.id
+
+def comment(user_id, post_id, parent_id=None):
+    return services.post_service.create_comment(user_id, post_id, 'text', parent_id).id
+
+def comment_count(post_id):
+    db.session.expire_all()
+    return db.session.get(Post, post_id).comment_count
+
+def test_reply_path_extends_parent_path(post):
+    alice, post_id = post
+    top = comment(alice, post_id)
+    reply = comment(alice, post_id, top)
+    nested = comment(alice, post_id, reply)
+
+    assert db.session.get(PostComment, top).path == f'{top:010d}/'
+    assert db.session.get(PostComment, reply).path == f'{top:010d}/{reply:010d}/'
+    assert db.session.get(PostComment, nested).path == f'{top:010d}/{reply:010d}/{nested:010d}/'
+
+def test_replies_nest_up_to_max_depth(monkeypatch, post):
+    alice, post_id = post
+    monkeypatch.setattr(PostComment, 'MAX_DEPTH', 3)
+    parent = None
+    for _ in range(3):
+        parent = comment(alice, post_id, parent)
+
+    with pytest.raises(PostServiceError, match='nested any deeper'):
+        comment(alice, post_id, parent)
+    assert comment_count(post_id) == 3
+
+def test_delete_removes_only_the_subtree(post):
+    alice, post_id = post
+    first = comment(alice, post_id)
+    reply = comment(alice, post_id, first)
+    comment(alice, post_id, reply)
+    sibling_reply = comment(alice, post_id, first)
+    # Ids next to the deleted range must stay
+    second = comment(alice, post_id)
+    second_reply = comment(alice, post_id, second)
+
+    subtree = db.session.get(PostComment, reply)
+    assert services.post_service.count_comment_subtree(subtree) == 2
+
+    services.post_service.delete_comment(alice, reply)
+
+    remaining = {c.id for c in PostComment.query.all()}
+    assert remaining == {first, sibling_reply, second, second_reply}
+    assert comment_count(post_id) == 4
+
+def test_comment_count_after_subtree_delete(post):
+    alice, post_id = post
+    top = comment(alice, post_id)
+    reply = comment(alice, post_id, top)
+    comment(alice, post_id, reply)
+    comment(alice, post_id)
+    assert comment_count(post_id) == 4
+
+    services.post_service.delete_comment(alice, top)
+    assert comment_count(post_id) == 1
+
+def test_thread_and_reply_totals(client, login, post):
+    alice, post_id = post
+    top = comment(alice, post_id)
+    reply = comment(alice, post_id, top)
+    nested = comment(alice, post_id, reply)
+    login('alice')
+
+    thread = client.get(f'/api/comment/{top}/thread').get_json()['comment']
+    assert thread['id'] == top
+    assert [r['id'] for r in thread['replies']] == [reply]
+    assert [r['id'] for r in thread['replies'][0]['replies']] == [nested]
+
+    replies = client.get(f'/api/comment/{top}/replies').get_json()
+    assert [r['id'] for r in replies['replies']] == [reply]
+    assert replies['total_reply_count'] == 2
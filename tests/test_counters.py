@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import update
+import repair_post_counters
+from app import db, services
+from app.models import Post, PostComment, PostLike
+from conftest import PASSWORD
+
+@pytest.fixture
+def post_id(make_user):
+    post = Post(owner=make_user('author'), description='hello')
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+def counters(post_id):
+    """(like_count, comment_count), checked against the rows they count"""
+    db.session.expire_all()
+    post = db.session.get(Post, post_id)
+    assert post.like_count == PostLike.query.filter_by(post_id=post_id).count()
+    assert post.comment_count == PostComment.query.filter_by(post_id=post_id).count()
+    return post.like_count, post.comment_count
+
+def comment(user_id, post_id, parent_id=None):
+    return services.post_service.create_comment(user_id, post_id, 'text', parent_id).id
+
+def test_counters_follow_likes_and_comments(make_user, post_id):
+    alice, bob = make_user('alice'), make_user('bob')
+
+    services.post_service.toggle_like(alice, post_id)
+    services.post_service.toggle_like(bob, post_id)
+    assert counters(post_id) == (2, 0)
+    services.post_service.toggle_like(alice, post_id)
+    assert counters(post_id) == (1, 0)
+
+    top = comment(alice, post_id)
+    reply = comment(bob, post_id, top)
+    comment(alice, post_id, reply)
+    comment(bob, post_id)
+    assert counters(post_id) == (1, 4)
+
+    services.post_service.delete_comment(alice, top)
+    assert counters(post_id) == (1, 1)
+
+def test_counters_after_account_deletion(make_user, post_id):
+    alice, bob = make_user('alice'), make_user('bob')
+    services.post_service.toggle_like(alice, post_id)
+    services.post_service.toggle_like(bob, post_id)
+    top = comment(bob, post_id)
+    comment(alice, post_id, top)
+    comment(alice, post_id)
+    assert counters(post_id) == (2, 3)
+
+    # Alice's like and comments go with her account
+    services.user_settings_service.delete_account(alice, PASSWORD)
+    assert counters(post_id) == (1, 1)
+
+def test_repair_script(app, monkeypatch, capsys, make_user, post_id):
+    alice = make_user('alice')
+    services.post_service.toggle_like(alice, post_id)
+    comment(alice, post_id)
+    db.session.execute(update(Post).values(like_count=7, comment_count=-2))
+    db.session.commit()
+
+    monkeypatch.setattr(repair_post_counters, 'app_init', lambda: app)
+    repair_post_counters.repair()
+
+    assert counters(post_id) == (1, 1)
+    assert 'Counters repaired for 1 posts' in capsys.readouterr().out
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import Post
+
+START = datetime(2026, 1, 1)
+
+@pytest.fixture
+def post_ids(make_user, login):
+    """Seven posts, oldest first; the middle three share a timestamp so
+    pages have to break ties on id"""
+    owner = make_user('alice')
+    login('alice')
+    times = [START, START + timedelta(minutes=1)] + [START + timedelta(minutes=2)] * 3 + \
+            [START + timedelta(minutes=3), START + timedelta(minutes=4)]
+    posts = [Post(owner=owner, description=f'post {i}', created_at=created_at) for i, created_at in enumerate(times)]
+    db.session.add_all(posts)
+    db.session.commit()
+    return [post.id for post in posts]
+
+def get_page(client, **args):
+    response = client.get('/api/posts', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_pages_walk_back_without_gaps(client, post_ids):
+    seen = []
+    page = get_page(client, limit=2)
+    while True:
+        seen.extend(post['id'] for post in page['posts'])
+        if not page['next_cursor']:
+            break
+        page = get_page(client, limit=2, before=page['next_cursor'])
+
+    assert seen == list(reversed(post_ids))
+
+def test_after_returns_newer_posts(client, post_ids):
+    first = get_page(client, limit=2)
+    second = get_page(client, limit=2, before=first['next_cursor'])
+
+    # Paging forward from the second page lands back on the first
+    newer = get_page(client, limit=2, after=second['prev_cursor'])
+    assert [post['id'] for post in newer['posts']] == [post['id'] for post in first['posts']]
+
+def test_last_page_has_no_next_cursor(client, post_ids):
+    page = get_page(client, limit=len(post_ids))
+    assert len(page['posts']) == len(post_ids)
+    assert page['next_cursor'] is None
+
+def test_invalid_cursor(client, post_ids):
+    response = client.get('/api/posts', query_string={'before': 'not-a-cursor'})
+    assert response.status_code == 400
@@ -0,0 +1,86 @@
+import pytest
+from app import db
+from app.models import Post, PostLike
+from app import services
+from app.services.like_buffer import LikeBufferError
+
+@pytest.fixture
+def post_id(make_user):
+    post = Post(owner=make_user('author'), description='hello')
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+@pytest.fixture
+def like_buffer(app):
+    return services.like_buffer
+
+def like_count(post_id):
+    db.session.expire_all()
+    return db.session.get(Post, post_id).like_count
+
+def test_like_toggle(client, make_user, login, post_id):
+    make_user('alice')
+    login('alice')
+
+    assert client.post(f'/api/like_post/{post_id}').get_data(as_text=True) == '1'
+    assert PostLike.query.filter_by(post_id=post_id).count() == 1
+
+    assert client.post(f'/api/like_post/{post_id}').get_data(as_text=True) == '0'
+    assert PostLike.query.filter_by(post_id=post_id).count() == 0
+    assert like_count(post_id) == 0
+
+def test_like_missing_post(client, make_user, login):
+    make_user('alice')
+    login('alice')
+
+    assert client.post('/api/like_post/999').status_code == 404
+
+def test_buffer_coalesces_toggles(like_buffer, make_user, post_id):
+    alice, bob = make_user('alice'), make_user('bob')
+
+    assert like_buffer.toggle(alice, post_id) == (True, 1)
+    assert like_buffer.toggle(bob, post_id) == (True, 2)
+    assert like_buffer.toggle(bob, post_id) == (False, 1)
+    assert like_buffer.pending_intents(alice, [post_id]) == {post_id: True}
+
+    like_buffer.flush()
+
+    assert like_count(post_id) == 1
+    assert [like.user_id for like in PostLike.query.filter_by(post_id=post_id)] == [alice]
+    assert like_buffer.pending_intents(alice, [post_id]) == {}
+
+def test_buffer_keeps_toggles_when_flush_fails(like_buffer, make_user, post_id, monkeypatch):
+    alice = make_user('alice')
+    like_buffer.toggle(alice, post_id)
+
+    def fail():
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(db.session, 'commit', fail)
+    with pytest.raises(LikeBufferError):
+        like_buffer.flush()
+    monkeypatch.undo()
+
+    assert like_buffer.pending_intents(alice, [post_id]) == {post_id: True}
+
+    # Writing the restored intent again does not count the like twice
+    like_buffer.flush()
+
+    assert like_count(post_id) == 1
+    assert PostLike.query.filter_by(post_id=post_id, user_id=alice).count() == 1
+
+def test_buffer_drops_toggles_on_deleted_posts(like_buffer, make_user, post_id):
+    alice = make_user('alice')
+    doomed = Post(owner=alice, description='bye')
+    db.session.add(doomed)
+    db.session.commit()
+
+    like_buffer.toggle(alice, post_id)
+    like_buffer.toggle(alice, doomed.id)
+    db.session.delete(doomed)
+    db.session.commit()
+
+    like_buffer.flush()
+
+    assert like_count(post_id) == 1
+    assert like_buffer.pending_intents(alice, [post_id, doomed.id]) == {}
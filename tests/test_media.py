@@ -0,0 +1,82 @@
+import os
+import pytest
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def media_file(static_root):
+    """Write a file under the static folder and return its /media URL"""
+    def media_file(path, data=DATA):
+        file_path = os.path.join(static_root, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return f'/media/{path}'
+    return media_file
+
+def test_uploads_are_cached_forever(app, client, media_file):
+    response = client.get(media_file('uploads/ab/cd/abcd.png'))
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.cache_control.public
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == app.config['MEDIA_MAX_AGE']
+
+def test_strong_etag_revalidates(client, media_file):
+    url = media_file('uploads/ab/cd/abcd.png')
+    etag, weak = client.get(url).get_etag()
+    assert etag == 'abcd.png' and not weak
+
+    response = client.get(url, headers={'If-None-Match': '"abcd.png"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_range_request(client, media_file):
+    response = client.get(media_file('uploads/ab/cd/abcd.png'), headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == DATA[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(DATA)}'
+
+def test_x_accel_hands_file_to_proxy(app, monkeypatch, client, media_file):
+    monkeypatch.setitem(app.config, 'MEDIA_SENDFILE', 'x-accel')
+    response = client.get(media_file('uploads/ab/cd/abcd.png'))
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == '/protected-media/uploads/ab/cd/abcd.png'
+    assert response.cache_control.immutable
+
+    response = client.get('/media/uploads/ab/cd/abcd.png', headers={'If-None-Match': '"abcd.png"'})
+    assert response.status_code == 304
+
+@pytest.mark.parametrize('path', [
+    'uploads/../../conftest.py',
+    'uploads/%2e%2e/secret.png',
+    'secret.png',
+])
+def test_only_uploads_are_served(client, media_file, path):
+    media_file('secret.png')
+    assert client.get(f'/media/{path}').status_code == 404
+
+def test_variants_negotiate_modern_formats(client, media_file):
+    url = media_file('uploads/ab/cd/abcd_feed.jpg', b'jpeg')
+    media_file('uploads/ab/cd/abcd_feed.webp', b'webp')
+    media_file('uploads/ab/cd/abcd_feed.avif', b'avif')
+
+    response = client.get(url, headers={'Accept': 'image/avif,image/webp,*/*'})
+    assert response.data == b'avif'
+    assert response.mimetype == 'image/avif'
+    assert 'Accept' in response.vary
+
+    response = client.get(url, headers={'Accept': 'image/webp,*/*'})
+    assert response.data == b'webp'
+    assert response.get_etag()[0] == 'abcd_feed.webp'
+
+    response = client.get(url, headers={'Accept': '*/*'})
+    assert response.data == b'jpeg'
+    assert 'Accept' in response.vary
+
+def test_missing_alternate_falls_back(client, media_file):
+    url = media_file('uploads/ab/cd/abcd_thumb.png', b'png')
+    response = client.get(url, headers={'Accept': 'image/avif,image/webp'})
+    assert response.data == b'png'
+    assert 'Accept' in response.vary
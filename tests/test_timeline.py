@@ -0,0 +1,115 @@
+import pytest
+from app import db, services
+from app.models import TimelineEntry, User
+from app.services.timeline_service import TimelineServiceError
+
+@pytest.fixture
+def users(make_user):
+    return make_user('alice'), make_user('bob'), make_user('carol')
+
+def befriend(requester_id, requested_id):
+    friendship = services.friendship_service.send_friend_request(requester_id, requested_id)
+    services.friendship_service.accept_friend_request(friendship.id, requested_id)
+
+def unfriend(user_id, friend_id):
+    services.friendship_service.remove_friend(user_id, friend_id)
+    db.session.commit()
+
+def post(user_id, description='post'):
+    return services.post_service.create_post(user_id, None, description).id
+
+def timeline(user_id, **args):
+    return [p['id'] for p in services.post_service.query_timeline(user_id, **args)['posts']]
+
+def pushed(user_id):
+    """Post ids in the user's materialized timeline"""
+    return {entry.post_id for entry in TimelineEntry.query.filter_by(user_id=user_id)}
+
+def pull_mode(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).timeline_pull
+
+def test_posts_fan_out_to_friends(users):
+    alice, bob, carol = users
+    befriend(alice, bob)
+    post_id = post(alice)
+
+    assert pushed(bob) == {post_id}
+    assert pushed(carol) == set()
+    assert timeline(alice) == [post_id]
+
+def test_new_friend_gets_recent_posts(users):
+    alice, bob, carol = users
+    older = post(alice)
+    newer = post(alice)
+
+    befriend(bob, alice)
+    assert timeline(bob) == [newer, older]
+
+def test_removed_friend_posts_leave_timeline(users):
+    alice, bob, carol = users
+    befriend(alice, bob)
+    befriend(carol, bob)
+    alice_post = post(alice)
+    carol_post = post(carol)
+
+    unfriend(bob, alice)
+    assert timeline(bob) == [carol_post]
+    assert alice_post not in pushed(bob)
+
+def test_crossing_fanout_limit_switches_mode(app, monkeypatch, users):
+    alice, bob, carol = users
+    monkeypatch.setitem(app.config, 'TIMELINE_FANOUT_FRIEND_LIMIT', 1)
+    befriend(alice, bob)
+    assert not pull_mode(alice)
+
+    befriend(alice, carol)
+    assert pull_mode(alice)
+
+    # Friends merge the post in at read time instead of getting a copy
+    post_id = post(alice)
+    assert pushed(bob) == set()
+    assert timeline(bob) == [post_id]
+
+    # Back under the limit: the post is pushed before pull mode is cleared
+    unfriend(alice, carol)
+    assert not pull_mode(alice)
+    assert pushed(bob) == {post_id}
+    assert timeline(bob) == [post_id]
+
+def test_failed_fanout_falls_back_to_pull(monkeypatch, users):
+    alice, bob, carol = users
+    befriend(alice, bob)
+
+    def fail(post):
+        raise TimelineServiceError('fan-out failed')
+    monkeypatch.setattr(services.timeline_service, 'fan_out_post', fail)
+
+    post_id = post(alice)
+    assert pull_mode(alice)
+    assert pushed(alice) == {post_id}
+    assert timeline(bob) == [post_id]
+
+def test_pulled_posts_merge_in_order(app, monkeypatch, make_user, users):
+    alice, bob, carol = users
+    monkeypatch.setitem(app.config, 'TIMELINE_FANOUT_FRIEND_LIMIT', 1)
+    befriend(alice, bob)
+    befriend(alice, make_user('dave'))
+    befriend(carol, bob)
+
+    # Bob gets carol's posts pushed and pulls alice's
+    assert pull_mode(alice)
+    assert not pull_mode(carol)
+    post_ids = [post(author, f'post {i}') for i, author in enumerate([carol, alice, carol, alice, alice, carol])]
+    newest_first = list(reversed(post_ids))
+
+    assert timeline(bob) == newest_first
+
+    seen = []
+    page = services.post_service.query_timeline(bob, limit=2)
+    while True:
+        seen.extend(p['id'] for p in page['posts'])
+        if not page['next_cursor']:
+            break
+        page = services.post_service.query_timeline(bob, limit=2, before=page['next_cursor'])
+    assert seen == newest_first
@@ -0,0 +1,88 @@
+import os
+import time
+import pytest
+from app import db, services
+from app.models import Message, Post, UploadBlob, User
+from app.services.image_service import variant_path
+
+@pytest.fixture
+def stored(make_image):
+    """Store an image and return its static-relative path"""
+    def stored(color=(200, 10, 10), reference=True):
+        path = services.upload_service.store(make_image(color), reference=reference)
+        db.session.commit()
+        return path
+    return stored
+
+def on_disk(static_root, path):
+    return os.path.exists(os.path.join(static_root, path))
+
+def write_legacy(static_root, name):
+    """A file saved before blobs existed, old enough to be past any grace period"""
+    path = f'uploads/{name}'
+    file_path = os.path.join(static_root, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(b'legacy')
+    old = time.time() - 7 * 86400
+    os.utime(file_path, (old, old))
+    return path
+
+def blob(path):
+    db.session.expire_all()
+    return UploadBlob.query.filter_by(path=path).first()
+
+def test_referenced_blob_survives(static_root, stored):
+    path = stored()
+
+    metrics = services.upload_sweeper.sweep(grace_seconds=0)
+    assert metrics['deleted'] == 0
+    assert on_disk(static_root, path)
+    assert blob(path).ref_count == 1
+
+def test_released_blob_waits_for_grace_period(static_root, stored):
+    path = stored()
+    variant = variant_path(path, 'thumb', 'webp')
+    with open(os.path.join(static_root, variant), 'wb') as f:
+        f.write(b'variant')
+    services.upload_service.release(path)
+    db.session.commit()
+
+    # Still inside the default grace period
+    assert services.upload_sweeper.sweep()['deleted'] == 0
+    assert on_disk(static_root, path)
+    assert blob(path) is not None
+
+    metrics = services.upload_sweeper.sweep(grace_seconds=0)
+    assert metrics['deleted'] == 1
+    assert not on_disk(static_root, path)
+    assert not on_disk(static_root, variant)
+    assert blob(path) is None
+
+def test_legacy_files_in_use_are_kept(static_root, make_user):
+    alice, bob = make_user('alice'), make_user('bob')
+    post_image = write_legacy(static_root, 'post.jpg')
+    chat_image = write_legacy(static_root, 'chat.jpg')
+    avatar = write_legacy(static_root, 'avatar.jpg')
+    unused = write_legacy(static_root, 'unused.jpg')
+
+    db.session.add(Post(owner=alice, image_path=post_image))
+    db.session.add(Message(sender_id=alice, receiver_id=bob, image_url=chat_image))
+    db.session.get(User, bob).avatar_path = avatar
+    db.session.commit()
+
+    metrics = services.upload_sweeper.sweep()
+    assert metrics['deleted'] == 1
+    assert not on_disk(static_root, unused)
+    assert all(on_disk(static_root, path) for path in (post_image, chat_image, avatar))
+
+def test_dry_run_deletes_nothing(static_root, stored):
+    path = stored(reference=False)
+    legacy = write_legacy(static_root, 'unused.jpg')
+
+    metrics = services.upload_sweeper.sweep(dry_run=True, grace_seconds=0)
+    assert metrics['orphaned'] == 2
+    assert metrics['deleted'] == 0
+    assert on_disk(static_root, path)
+    assert on_disk(static_root, legacy)
+    assert blob(path) is not None
@@ -0,0 +1,193 @@
+import hashlib
+import io
+import os
+import threading
+import pytest
+from app import db, services
+from app.models import UploadBlob
+from app.services.upload_service import fcntl
+from conftest import PASSWORD
+
+DATA = bytes(range(256)) * 40
+
+@pytest.fixture
+def upload(client, make_user, login):
+    """upload_id of a new resumable upload of DATA"""
+    make_user('alice')
+    login('alice')
+    response = client.post('/api/uploads', json={'filename': 'photo.jpg', 'size': len(DATA)})
+    assert response.status_code == 200
+    return response.get_json()['upload_id']
+
+def put(client, upload_id, offset, data):
+    return client.put(f'/api/uploads/{upload_id}?offset={offset}', data=data)
+
+def session_file(app, upload_id):
+    return os.path.join(app.config['UPLOAD_SESSION_FOLDER'], upload_id)
+
+def test_chunks_resume_from_offset(app, client, upload):
+    assert put(client, upload, 0, DATA[:1000]).get_json()['offset'] == 1000
+    assert client.get(f'/api/uploads/{upload}').get_json()['offset'] == 1000
+    assert put(client, upload, 1000, DATA[1000:]).get_json()['offset'] == len(DATA)
+
+    with open(session_file(app, upload), 'rb') as f:
+        assert f.read() == DATA
+
+def test_chunk_at_wrong_offset(client, upload):
+    put(client, upload, 0, DATA[:1000])
+
+    # A retried chunk the server already has
+    response = put(client, upload, 0, DATA[:1000])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 1000
+
+    # A chunk past a gap
+    response = put(client, upload, 2000, DATA[2000:3000])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 1000
+
+def test_chunk_past_declared_size(client, upload):
+    response = put(client, upload, 0, DATA + b'extra')
+    assert response.status_code == 400
+    assert client.get(f'/api/uploads/{upload}').get_json()['offset'] <= len(DATA)
+
+def test_concurrent_retries_write_once(app, upload):
+    barrier = threading.Barrier(2)
+    results = []
+
+    class Stream:
+        """Holds a writer inside write_chunk until the other one gets there
+        too, or a second has passed"""
+        def __init__(self):
+            self.sent = False
+
+        def read(self, size):
+            if self.sent:
+                return b''
+            self.sent = True
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            return DATA[:1000]
+
+    def write():
+        with app.app_context():
+            try:
+                services.upload_service.write_chunk(1, upload, 0, Stream())
+                results.append('written')
+            except Exception as e:
+                results.append(type(e).__name__)
+
+    writers = [threading.Thread(target=write) for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert sorted(results) == ['UploadOffsetError', 'written']
+    assert os.path.getsize(session_file(app, upload)) == 1000
+
+@pytest.mark.skipif(fcntl is None, reason='flock() is not available')
+def test_chunks_wait_for_other_processes(app, upload):
+    """A lock held on its own open file stands in for another worker process"""
+    results = []
+
+    def write():
+        with app.app_context():
+            try:
+                services.upload_service.write_chunk(1, upload, 0, io.BytesIO(DATA[:1000]))
+                results.append('written')
+            except Exception as e:
+                results.append(type(e).__name__)
+
+    with open(session_file(app, upload), 'r+b') as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join(timeout=0.5)
+        assert writer.is_alive()
+
+        # The other process writes the same chunk first
+        other.write(DATA[:1000])
+        other.flush()
+        fcntl.flock(other, fcntl.LOCK_UN)
+
+    writer.join()
+    assert results == ['UploadOffsetError']
+    assert os.path.getsize(session_file(app, upload)) == 1000
+
+def test_missing_session_file(app, client, upload):
+    put(client, upload, 0, DATA)
+    os.remove(session_file(app, upload))
+
+    response = client.post('/upload_image', data={'upload_id': upload})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Upload not found'
+
+def test_image_and_upload_id_together(client, upload):
+    put(client, upload, 0, DATA)
+
+    response = client.post('/upload_image', data={'upload_id': upload, 'image': (io.BytesIO(DATA), 'a.jpg')})
+    assert response.status_code == 400
+    assert 'not both' in response.get_json()['message']
+
+def blob_of(path):
+    db.session.expire_all()
+    return UploadBlob.query.filter_by(path=path).one()
+
+def test_identical_bytes_share_one_blob(static_root, make_user, make_image):
+    alice = make_user('alice')
+    first = services.post_service.create_post(alice, make_image(), 'first').image_path
+    second = services.post_service.create_post(alice, make_image(), 'second').image_path
+    avatar = services.user_settings_service.upload_avatar(alice, make_image())
+
+    assert first == second == avatar
+    assert blob_of(first).ref_count == 3
+    assert UploadBlob.query.count() == 1
+
+    # Stored under uploads/ab/cd/<sha256>.<ext>
+    sha256 = hashlib.sha256(make_image().stream.read()).hexdigest()
+    assert first == f'uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}.png'
+    assert os.listdir(os.path.join(static_root, 'uploads', sha256[:2], sha256[2:4])) == [f'{sha256}.png']
+
+def test_references_dropped_on_release(client, login, make_user, make_image):
+    alice, bob = make_user('alice'), make_user('bob')
+    post = services.post_service.create_post(alice, make_image(), 'post')
+    path = post.image_path
+    services.user_settings_service.upload_avatar(alice, make_image())
+
+    login('alice')
+    response = client.post('/api/upload_chat_image', data={'image': (make_image().stream, 'image.png')})
+    assert response.get_json()['image_url'] == path
+    response = client.post('/api/send_message', json={'friend_id': bob, 'content': 'look', 'image_url': path})
+    assert response.status_code == 200
+    assert blob_of(path).ref_count == 3
+
+    services.post_service.delete_post(alice, post.id)
+    assert blob_of(path).ref_count == 2
+
+    # Replacing the avatar releases the old one
+    services.user_settings_service.upload_avatar(alice, make_image(color=(10, 200, 10)))
+    assert blob_of(path).ref_count == 1
+
+    # The message image goes with the account
+    services.user_settings_service.delete_account(bob, PASSWORD)
+    assert blob_of(path).ref_count == 0
+
+def test_reupload_takes_released_blob_back(static_root, make_user, make_image):
+    alice = make_user('alice')
+    path = services.upload_service.store(make_image())
+    services.upload_service.release(path)
+    db.session.commit()
+    assert blob_of(path).ref_count == 0
+
+    # Stored again before the sweeper got to it
+    assert services.upload_service.store(make_image()) == path
+    db.session.commit()
+    assert not services.upload_sweeper._claim(path)
+    db.session.rollback()
+
+    assert services.upload_sweeper.sweep(grace_seconds=0)['deleted'] == 0
+    assert blob_of(path).ref_count == 1
+    assert os.path.exists(os.path.join(static_root, path))